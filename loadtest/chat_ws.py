@@ -0,0 +1,329 @@
+"""
+Нагрузочный тест ws-подключений чата
+
+Создаёт в БД пользователей и диалоги, сессии в redis, открывает по --room-size
+подключений /dialog/{id}/ws на каждый из --dialogs диалогов и в течение --duration
+секунд отправляет в каждый диалог --rate сообщений в секунду. Задержка доставки
+считается по времени отправки, зашитому в текст сообщения, для каждого получателя
+(включая отправителя).
+
+    docker compose -f loadtest/docker-compose.yml up -d
+    python -m loadtest.chat_ws --spawn --dialogs 1000 --room-size 2 --rate 1 --duration 30
+"""
+import argparse
+import asyncio
+import dataclasses
+import json
+import os
+import resource
+import statistics
+import subprocess
+import sys
+import time
+import uuid
+from typing import Optional
+
+import aiohttp
+import redis.asyncio as redis
+import websockets
+from sqlalchemy import insert
+
+from loadtest.server import loadtest_config
+from src.db import create_psql_async_session
+from src.models import tables
+from src.models.enums.role import UserRole
+from src.services.auth import JWTManager
+from src.services.auth.session import SessionManager
+
+# websockets>=14 переименовал extra_headers
+HEADERS_ARG = "additional_headers" if int(websockets.__version__.split(".")[0]) >= 14 else "extra_headers"
+
+
+@dataclasses.dataclass
+class Dialog:
+    id: uuid.UUID
+    cookies: list[str]  # заголовки Cookie обоих участников
+
+
+@dataclasses.dataclass
+class Stats:
+    sent: int = 0
+    delivered: int = 0
+    errors: int = 0
+    closed: int = 0
+    latencies: list[float] = dataclasses.field(default_factory=list)
+    connect_times: list[float] = dataclasses.field(default_factory=list)
+
+
+async def seed(dialogs: int) -> list[Dialog]:
+    """
+    Пользователи, диалоги и сессии для теста
+
+    """
+    config = loadtest_config()
+    pg = config.DB.POSTGRESQL
+    engine, db_session = create_psql_async_session(
+        username=pg.USERNAME,
+        password=pg.PASSWORD,
+        host=pg.HOST,
+        port=pg.PORT,
+        database=pg.DATABASE
+    )
+    run = uuid.uuid4().hex[:8]
+    users = [
+        dict(
+            id=uuid.uuid4(),
+            email=f"loadtest-{run}-{i}@example.com",
+            first_name="Load",
+            last_name=f"Test{i}",
+            department="loadtest",
+            job_title="loadtest",
+            hashed_password="-",
+            role=UserRole.USER
+        )
+        for i in range(dialogs * 2)
+    ]
+    chats = [
+        dict(zip(("user_low", "user_high"), sorted((users[i * 2]["id"], users[i * 2 + 1]["id"]))), id=uuid.uuid4())
+        for i in range(dialogs)
+    ]
+    members = [
+        dict(user_id=users[i * 2 + j]["id"], chat_id=chat["id"])
+        for i, chat in enumerate(chats)
+        for j in range(2)
+    ]
+    async with db_session() as session:
+        for table, rows in [(tables.User, users), (tables.Chat, chats), (tables.UserChatAssociation, members)]:
+            for i in range(0, len(rows), 1000):
+                await session.execute(insert(table).values(rows[i:i + 1000]))
+        await session.commit()
+    await engine.dispose()
+
+    jwt = JWTManager(config=config)
+    client = redis.Redis(host=config.DB.REDIS.HOST, port=config.DB.REDIS.PORT, decode_responses=True)
+    cookies = list()
+    async with client.pipeline(transaction=False) as pipe:
+        for user in users:
+            tokens = jwt.generate_tokens(id=user["id"], email=user["email"], role_value=user["role"].value)
+            session_id = uuid.uuid4().int
+            pipe.set(str(session_id), tokens.refresh_token, ex=3600)
+            cookies.append(
+                f"{JWTManager.COOKIE_ACCESS_KEY}={tokens.access_token}; "
+                f"{JWTManager.COOKIE_REFRESH_KEY}={tokens.refresh_token}; "
+                f"{SessionManager.COOKIE_SESSION_KEY}={session_id}"
+            )
+        await pipe.execute()
+    await client.close()
+
+    return [Dialog(id=chat["id"], cookies=cookies[i * 2:i * 2 + 2]) for i, chat in enumerate(chats)]
+
+
+async def receive(socket, stats: Stats) -> None:
+    try:
+        async for frame in socket:
+            data = json.loads(frame)
+            if "text" not in data:
+                continue  # ping и служебные события
+            sent_at = float(data["text"].split(":", 1)[1])
+            stats.latencies.append(time.perf_counter() - sent_at)
+            stats.delivered += 1
+    except websockets.ConnectionClosed:
+        stats.closed += 1
+
+
+async def send(socket, rate: float, duration: float, stats: Stats) -> None:
+    # Случайный сдвиг, чтобы диалоги не отправляли сообщения в один и тот же момент
+    await asyncio.sleep(1 / rate * (uuid.uuid4().int % 1000) / 1000)
+    loop = asyncio.get_running_loop()
+    deadline = loop.time() + duration
+    seq = 0
+    while loop.time() < deadline:
+        seq += 1
+        try:
+            await socket.send(json.dumps({"text": f"{seq}:{time.perf_counter()}", "files": []}))
+        except websockets.ConnectionClosed:
+            return
+        stats.sent += 1
+        await asyncio.sleep(1 / rate)
+
+
+async def connect(url: str, cookie: str, semaphore: asyncio.Semaphore, stats: Stats):
+    async with semaphore:
+        started = time.perf_counter()
+        try:
+            socket = await websockets.connect(
+                url,
+                max_size=None,
+                ping_interval=None,
+                **{HEADERS_ARG: {"Cookie": cookie}}
+            )
+        except Exception:
+            stats.errors += 1
+            return None
+        stats.connect_times.append(time.perf_counter() - started)
+        return socket
+
+
+def rss(pid: Optional[int]) -> Optional[int]:
+    """
+    Resident set size процесса, байт (Linux)
+
+    """
+    if not pid:
+        return None
+    try:
+        with open(f"/proc/{pid}/status") as status:
+            for line in status:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1]) * 1024
+    except OSError:
+        return None
+
+
+def percentile(values: list[float], p: float) -> float:
+    if not values:
+        return float("nan")
+    if len(values) == 1:
+        return values[0]
+    return statistics.quantiles(values, n=100, method="inclusive")[p - 1]
+
+
+async def wait_for_server(base_url: str, timeout: float = 30) -> None:
+    deadline = time.monotonic() + timeout
+    async with aiohttp.ClientSession() as session:
+        while True:
+            try:
+                async with session.get(f"{base_url}/version") as response:
+                    if response.status == 200:
+                        return
+            except aiohttp.ClientError:
+                pass
+            if time.monotonic() > deadline:
+                raise TimeoutError(f"Сервер {base_url} не запустился за {timeout} сек")
+            await asyncio.sleep(0.2)
+
+
+async def chat_stats(base_url: str) -> Optional[dict]:
+    try:
+        async with aiohttp.ClientSession() as session:
+            async with session.get(f"{base_url}/chat_stats") as response:
+                return await response.json()
+    except aiohttp.ClientError:
+        return None
+
+
+async def run(args) -> dict:
+    base_url = f"http://{args.host}:{args.port}"
+    ws_url = f"ws://{args.host}:{args.port}"
+    await wait_for_server(base_url)
+
+    dialogs = await seed(args.dialogs)
+    rss_idle = rss(args.server_pid)
+
+    stats = Stats()
+    semaphore = asyncio.Semaphore(args.connect_concurrency)
+    started = time.perf_counter()
+    rooms = await asyncio.gather(*(
+        asyncio.gather(*(
+            connect(f"{ws_url}/dialog/{dialog.id}/ws", dialog.cookies[i % 2], semaphore, stats)
+            for i in range(args.room_size)
+        ))
+        for dialog in dialogs
+    ))
+    connect_elapsed = time.perf_counter() - started
+    connections = sum(1 for room in rooms for socket in room if socket)
+    await asyncio.sleep(1)
+    rss_connected = rss(args.server_pid)
+    server_stats = await chat_stats(base_url)
+
+    receivers = [asyncio.create_task(receive(socket, stats)) for room in rooms for socket in room if socket]
+    started = time.perf_counter()
+    await asyncio.gather(*(
+        send(room[0], args.rate, args.duration, stats)
+        for room in rooms if room[0]
+    ))
+    elapsed = time.perf_counter() - started
+    # Даём дойти сообщениям, которые ещё в пути
+    await asyncio.sleep(args.settle)
+    rss_loaded = rss(args.server_pid)
+
+    await asyncio.gather(*(socket.close() for room in rooms for socket in room if socket), return_exceptions=True)
+    for task in receivers:
+        task.cancel()
+    await asyncio.gather(*receivers, return_exceptions=True)
+
+    # Каждое сообщение доставляется во все подключения своего диалога
+    expected = stats.sent * connections / len(rooms) if rooms else 0
+    latencies_ms = [latency * 1000 for latency in stats.latencies]
+    return dict(
+        dialogs=args.dialogs,
+        room_size=args.room_size,
+        connections=connections,
+        connect_errors=stats.errors,
+        connect_seconds=round(connect_elapsed, 2),
+        connect_p99_ms=round(percentile([t * 1000 for t in stats.connect_times], 99), 1),
+        sent=stats.sent,
+        delivered=stats.delivered,
+        delivery_ratio=round(stats.delivered / expected, 4) if expected else None,
+        closed_by_server=stats.closed,
+        sent_per_second=round(stats.sent / elapsed, 1),
+        delivered_per_second=round(stats.delivered / (elapsed + args.settle), 1),
+        latency_p50_ms=round(percentile(latencies_ms, 50), 2),
+        latency_p95_ms=round(percentile(latencies_ms, 95), 2),
+        latency_p99_ms=round(percentile(latencies_ms, 99), 2),
+        latency_max_ms=round(max(latencies_ms), 2) if latencies_ms else None,
+        rss_idle_mb=round(rss_idle / 2 ** 20, 1) if rss_idle else None,
+        rss_connected_mb=round(rss_connected / 2 ** 20, 1) if rss_connected else None,
+        rss_loaded_mb=round(rss_loaded / 2 ** 20, 1) if rss_loaded else None,
+        rss_per_connection_kb=round((rss_connected - rss_idle) / connections / 1024, 1)
+        if rss_idle and rss_connected and connections else None,
+        server=server_stats
+    )
+
+
+def raise_nofile_limit() -> None:
+    soft, hard = resource.getrlimit(resource.RLIMIT_NOFILE)
+    if soft < hard:
+        resource.setrlimit(resource.RLIMIT_NOFILE, (hard, hard))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8010)
+    parser.add_argument("--spawn", action="store_true", help="запустить сервер (loadtest.server) в отдельном процессе")
+    parser.add_argument("--server-pid", type=int, help="pid уже запущенного сервера, для замера RSS")
+    parser.add_argument("--dialogs", type=int, default=500)
+    parser.add_argument("--room-size", type=int, default=2, help="подключений на диалог")
+    parser.add_argument("--rate", type=float, default=1.0, help="сообщений в секунду на диалог")
+    parser.add_argument("--duration", type=float, default=30.0, help="сек")
+    parser.add_argument("--settle", type=float, default=2.0, help="сек ожидания доставки после отправки")
+    parser.add_argument("--connect-concurrency", type=int, default=200)
+    parser.add_argument("--json", action="store_true", help="вывести результат одной строкой json")
+    args = parser.parse_args()
+
+    raise_nofile_limit()
+    server = None
+    if args.spawn:
+        server = subprocess.Popen(
+            [sys.executable, "-m", "loadtest.server", "--host", args.host, "--port", str(args.port)],
+            preexec_fn=raise_nofile_limit,
+            env=os.environ.copy()
+        )
+        args.server_pid = server.pid
+    try:
+        result = asyncio.run(run(args))
+    finally:
+        if server:
+            server.terminate()
+            server.wait(timeout=30)
+
+    if args.json:
+        print(json.dumps(result))
+        return
+    for key, value in result.items():
+        print(f"{key:<24}{value}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,89 @@
+"""
+Запуск приложения для нагрузочного теста без consul
+
+Конфигурация собирается из переменных окружения LOADTEST_* (по умолчанию -
+сервисы из loadtest/docker-compose.yml) и подставляется вместо load_consul_config
+до импорта src.app. Перед запуском к БД применяются миграции.
+
+    python -m loadtest.server --port 8010
+"""
+import argparse
+import asyncio
+import os
+
+from src import config as app_config
+from src.version import __version__
+
+
+def loadtest_config(*args, **kwargs) -> app_config.Config:
+    env = os.getenv
+    return app_config.Config(
+        DEBUG=False,
+        IS_SECURE_COOKIE=False,
+        BASE=app_config.Base(
+            TITLE="loadtest",
+            DESCRIPTION=None,
+            VERSION=__version__,
+            CONTACT=app_config.Contact(NAME=None, URL=None, EMAIL=None),
+            JWT=app_config.JWT(
+                ACCESS_SECRET_KEY=env("LOADTEST_ACCESS_SECRET_KEY", "loadtest-access"),
+                REFRESH_SECRET_KEY=env("LOADTEST_REFRESH_SECRET_KEY", "loadtest-refresh")
+            )
+        ),
+        DB=app_config.DbConfig(
+            POSTGRESQL=app_config.PostgresConfig(
+                HOST=env("LOADTEST_PG_HOST", "127.0.0.1"),
+                PORT=int(env("LOADTEST_PG_PORT", 55432)),
+                USERNAME=env("LOADTEST_PG_USER", "loadtest"),
+                PASSWORD=env("LOADTEST_PG_PASSWORD", "loadtest"),
+                DATABASE=env("LOADTEST_PG_DATABASE", "loadtest")
+            ),
+            REDIS=app_config.RedisConfig(
+                HOST=env("LOADTEST_REDIS_HOST", "127.0.0.1"),
+                PORT=int(env("LOADTEST_REDIS_PORT", 56379)),
+                USERNAME=None,
+                PASSWORD=None
+            ),
+            S3=app_config.S3Config(
+                HOST="127.0.0.1",
+                PORT=9000,
+                REGION="local",
+                ACCESS_KEY="loadtest",
+                SECRET_ACCESS_KEY="loadtest",
+                BUCKET="loadtest"
+            )
+        ),
+        CHAT=app_config.ChatConfig(
+            BROKER=env("LOADTEST_CHAT_BROKER", "redis"),
+            WRITE_BEHIND=bool(int(env("LOADTEST_CHAT_WRITE_BEHIND", 1))),
+            PING_INTERVAL=int(env("LOADTEST_CHAT_PING_INTERVAL", 0))
+        )
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8010)
+    args = parser.parse_args()
+
+    app_config.load_consul_config = loadtest_config
+    from src import migrations
+    from src.migrations.runner import engine_from_config
+    from src.app import app
+    from src.server import run
+
+    async def migrate():
+        engine = engine_from_config()
+        try:
+            await migrations.upgrade(engine)
+        finally:
+            await engine.dispose()
+
+    asyncio.run(migrate())
+
+    run(app, host=args.host, port=args.port, log_level="warning", ws_max_size=65536)
+
+
+if __name__ == "__main__":
+    main()
@@ -9,12 +9,21 @@ from starlette.middleware.cors import CORSMiddleware
 
 from src.models import tables
 from src.db import create_psql_async_session
-from src.middleware import JWTMiddlewareHTTP, JWTMiddlewareWS
+from src import migrations
+from src.middleware import JWTMiddlewareHTTP, JWTMiddlewareWS, QueryCountMiddleware
 from src.config import load_consul_config
 from src.exceptions import APIError, handle_api_error, handle_404_error, handle_pydantic_error
 
 from src.router import reg_root_api_router
 from src.services.chat import ChatManager
+from src.services.chat.broker import LocalBroker, RedisBroker
+from src.services.chat.stream import MessageStream
+from src.services.chat.hooks import on_messages_saved
+from src.services.chat.membership import ChatMembership
+from src.services.chat.unread import UnreadCounters
+from src.services.chat.versions import ChatVersions
+from src.services.repository import UserChatAssociationRepo
+from src.services.chat.writer import MessageWriter
 from src.services.storage.s3 import S3Storage
 from src.utils import RedisClient, AiohttpClient
 
@@ -49,9 +58,9 @@ async def init_postgresql_db():
     )
     app.state.db_session = session
 
-    async with engine.begin() as conn:
-        # await conn.run_sync(tables.Base.metadata.drop_all)
-        await conn.run_sync(tables.Base.metadata.create_all)
+    # Схему создают и обновляют миграции (python -m src.migrations upgrade),
+    # воркер только сверяет её версию
+    await migrations.check(engine)
 
 
 def init_s3_storage():
@@ -66,6 +75,43 @@ def init_s3_storage():
     )
 
 
+def init_chat_manager():
+    if config.CHAT.BROKER == "local":
+        broker = LocalBroker()
+    else:
+        broker = RedisBroker(app.state.redis)
+    stream = None
+    if config.CHAT.STREAM_MAXLEN:
+        stream = MessageStream(app.state.redis, maxlen=config.CHAT.STREAM_MAXLEN, ttl=config.CHAT.STREAM_TTL)
+    app.state.chat_manager = ChatManager(
+        broker=broker,
+        stream=stream,
+        send_queue_size=config.CHAT.SEND_QUEUE_SIZE,
+        ping_interval=config.CHAT.PING_INTERVAL,
+        ping_timeout=config.CHAT.PING_TIMEOUT
+    )
+
+
+def init_message_writer():
+    async def on_commit(session, batch):
+        await on_messages_saved(
+            UserChatAssociationRepo(session),
+            [(message.chat_id, message.owner_id, message.create_at) for message in batch],
+            versions=app.state.chat_versions,
+            unread=app.state.unread_counters
+        )
+
+    app.state.message_writer = None
+    if config.CHAT.WRITE_BEHIND:
+        app.state.message_writer = MessageWriter(
+            app.state.db_session,
+            batch_size=config.CHAT.WRITER_BATCH_SIZE,
+            flush_interval=config.CHAT.WRITER_FLUSH_INTERVAL / 1000,
+            queue_size=config.CHAT.WRITER_QUEUE_SIZE,
+            on_commit=on_commit
+        )
+
+
 async def redis_pool(db: int = 0):
     return await redis.Redis(
         host=config.DB.REDIS.HOST,
@@ -86,7 +132,18 @@ async def on_startup():
 
     app.state.redis = RedisClient(await redis_pool())
     app.state.http_client = AiohttpClient()
-    app.state.chat_manager = ChatManager()
+    app.state.chat_versions = ChatVersions(app.state.redis)
+    app.state.unread_counters = UnreadCounters(app.state.redis)
+    app.state.chat_membership = ChatMembership(
+        app.state.redis,
+        app.state.db_session,
+        cache_ttl=config.CHAT.MEMBERSHIP_CACHE_TTL
+    )
+    init_chat_manager()
+    await app.state.chat_manager.start()
+    init_message_writer()
+    if app.state.message_writer:
+        await app.state.message_writer.start()
 
     logging.debug("FastAPI startup event handler executed.")
 
@@ -95,6 +152,11 @@ async def on_startup():
 async def on_shutdown():
     logging.debug("Executing FastAPI shutdown event handler.")
     # Gracefully close utilities.
+    # Сокеты чата к этому моменту уже закрыты с кодом 1001 (src.server), здесь - брокер
+    await app.state.chat_manager.stop()
+    if app.state.message_writer:
+        # Дописываем в БД сообщения, ещё не сброшенные из очереди
+        await app.state.message_writer.stop()
     await app.state.redis.close()
     await app.state.http_client.close_session()
 
@@ -135,6 +197,8 @@ app.add_exception_handler(RequestValidationError, handle_pydantic_error)
 logging.debug("Registering middleware.")
 app.add_middleware(JWTMiddlewareHTTP)
 app.add_middleware(JWTMiddlewareWS)
+# Внешний слой: учитываются и запросы JWT-мидлвари
+app.add_middleware(QueryCountMiddleware)
 
 origins = [
     "http://localhost.tiangolo.com",
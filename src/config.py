@@ -43,6 +43,21 @@ class DbConfig:
     S3: Optional[S3Config]
 
 
+@dataclass
+class ChatConfig:
+    BROKER: str = "redis"
+    SEND_QUEUE_SIZE: int = 256
+    WRITE_BEHIND: bool = False  # рассылка до записи в БД, см. MessageWriter
+    WRITER_BATCH_SIZE: int = 500
+    WRITER_FLUSH_INTERVAL: int = 50  # мс
+    WRITER_QUEUE_SIZE: int = 10000
+    PING_INTERVAL: int = 20  # сек, 0 - без heartbeat
+    PING_TIMEOUT: int = 60  # сек
+    STREAM_MAXLEN: int = 1000  # 0 - без досылки при переподключении
+    STREAM_TTL: int = 86400  # сек
+    MEMBERSHIP_CACHE_TTL: int = 60  # сек
+
+
 @dataclass
 class Contact:
     NAME: Optional[str]
@@ -71,6 +86,7 @@ class Config:
     IS_SECURE_COOKIE: bool
     BASE: Base
     DB: DbConfig
+    CHAT: ChatConfig
 
 
 class KVManager:
@@ -92,6 +108,29 @@ class KVManager:
         return None
 
 
+def with_default(value, default):
+    """
+    Значение из consul или значение по умолчанию, если ключ не задан
+    """
+    return default if value is None else value
+
+
+def as_bool(value) -> bool:
+    """
+    Флаг из consul: 1/0, true/false, yes/no, on/off
+
+    :raises ValueError: для любого другого значения, чтобы опечатка не включила флаг
+    """
+    if isinstance(value, bool):
+        return value
+    normalized = str(value).strip().lower()
+    if normalized in ("1", "true", "yes", "on"):
+        return True
+    if normalized in ("0", "false", "no", "off"):
+        return False
+    raise ValueError(f"Ожидается 1 или 0, получено {value!r}")
+
+
 @lru_cache()
 def load_consul_config(
         root_name: str,
@@ -162,5 +201,18 @@ def load_consul_config(
                 SECRET_ACCESS_KEY=config("S3", "SECRET_ACCESS_KEY"),
                 BUCKET=config("S3", "BUCKET")
             )
+        ),
+        CHAT=ChatConfig(
+            BROKER=with_default(config("CHAT", "BROKER"), "redis"),
+            SEND_QUEUE_SIZE=with_default(config("CHAT", "SEND_QUEUE_SIZE"), 256),
+            WRITE_BEHIND=as_bool(with_default(config("CHAT", "WRITE_BEHIND"), 0)),
+            WRITER_BATCH_SIZE=with_default(config("CHAT", "WRITER_BATCH_SIZE"), 500),
+            WRITER_FLUSH_INTERVAL=with_default(config("CHAT", "WRITER_FLUSH_INTERVAL"), 50),
+            WRITER_QUEUE_SIZE=with_default(config("CHAT", "WRITER_QUEUE_SIZE"), 10000),
+            PING_INTERVAL=with_default(config("CHAT", "PING_INTERVAL"), 20),
+            PING_TIMEOUT=with_default(config("CHAT", "PING_TIMEOUT"), 60),
+            STREAM_MAXLEN=with_default(config("CHAT", "STREAM_MAXLEN"), 1000),
+            STREAM_TTL=with_default(config("CHAT", "STREAM_TTL"), 86400),
+            MEMBERSHIP_CACHE_TTL=with_default(config("CHAT", "MEMBERSHIP_CACHE_TTL"), 60)
         )
     )
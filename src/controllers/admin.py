@@ -4,11 +4,12 @@ from fastapi import APIRouter, Depends
 from fastapi import status as http_status
 
 from src.dependencies.services import get_services
+from src.dependencies.unit_of_work import UnitOfWorkRoute
 from src.models import schemas
 from src.services import ServiceFactory
 from src.views import CreateArticleResponse, UpdateArticleResponse, DeleteArticleResponse
 
-router = APIRouter()
+router = APIRouter(route_class=UnitOfWorkRoute)
 
 
 @router.delete("/delete_user", response_model=None, status_code=http_status.HTTP_204_NO_CONTENT)
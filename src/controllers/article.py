@@ -1,13 +1,21 @@
+from typing import Optional
+
 from fastapi import APIRouter, Depends
 from fastapi import status as http_status
 
 from src.dependencies.services import get_services
+from src.dependencies.unit_of_work import UnitOfWorkRoute
 from src.services import ServiceFactory
 from src.views.article import ArticleListResponse
 
-router = APIRouter()
+router = APIRouter(route_class=UnitOfWorkRoute)
 
 
 @router.get("/list", response_model=ArticleListResponse, status_code=http_status.HTTP_200_OK)
-async def get_article_list_range(count: int, services: ServiceFactory = Depends(get_services)):
-    return ArticleListResponse(message=await services.article.get_article_list_range(count))
+async def get_article_list_range(
+        count: Optional[int] = None,
+        after: Optional[str] = None,
+        services: ServiceFactory = Depends(get_services)
+):
+    articles, next_cursor = await services.article.get_article_list_range(count, after=after)
+    return ArticleListResponse(message=articles, next_cursor=next_cursor)
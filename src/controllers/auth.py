@@ -4,11 +4,12 @@ from fastapi.responses import Response
 from fastapi import status as http_status
 
 from src.dependencies.services import get_services
+from src.dependencies.unit_of_work import UnitOfWorkRoute
 from src.models import schemas
 from src.services import ServiceFactory
 from src.views import UserBigResponse
 
-router = APIRouter()
+router = APIRouter(route_class=UnitOfWorkRoute)
 
 
 @router.post("/signIn", status_code=http_status.HTTP_200_OK, response_model=UserBigResponse)
@@ -1,4 +1,5 @@
 import uuid
+from typing import Optional
 
 from fastapi import APIRouter, Depends, UploadFile
 from fastapi.requests import Request
@@ -6,17 +7,23 @@ from fastapi.responses import Response
 from fastapi import status as http_status
 
 from src.dependencies.services import get_services
+from src.dependencies.unit_of_work import UnitOfWorkRoute
 from src.models import schemas
 from src.services import ServiceFactory
 from src.views import UserBigResponse, FileItem
 from src.views.banner import BannerResponse, BannerAddResponse
 
-router = APIRouter()
+router = APIRouter(route_class=UnitOfWorkRoute)
 
 
 @router.get("/list", status_code=http_status.HTTP_200_OK, response_model=BannerResponse)
-async def banner_list(service: ServiceFactory = Depends(get_services)):
-    return BannerResponse(message=await service.banner.get_banners())
+async def banner_list(
+        after: Optional[str] = None,
+        limit: Optional[int] = None,
+        service: ServiceFactory = Depends(get_services)
+):
+    banners, next_cursor = await service.banner.get_banners(after=after, limit=limit)
+    return BannerResponse(message=banners, next_cursor=next_cursor)
 
 
 @router.post('/add', status_code=http_status.HTTP_204_NO_CONTENT)
@@ -1,20 +1,37 @@
 import uuid
+from typing import Optional, Union
 
 from fastapi import APIRouter, Depends
 from fastapi import status as http_status
+from fastapi.requests import Request
+from fastapi.responses import Response
 from fastapi.websockets import WebSocket
 
 from src.dependencies.services import get_services
+from src.dependencies.unit_of_work import UnitOfWorkRoute
 from src.services import ServiceFactory
+from src.utils.conditional import is_not_modified, not_modified, set_etag
 from src.views.dialog import DialogListResponse, DialogResponse
-from src.views.message import MessageResponse, MessageCountResponse
+from src.views.message import MessagePageResponse, CompactMessagePageResponse, MessageCountResponse, \
+    MessageSearchResponse
 
-router = APIRouter()
+router = APIRouter(route_class=UnitOfWorkRoute)
 
 
 @router.get("/list", response_model=DialogListResponse, status_code=http_status.HTTP_200_OK)
-async def get_dialog_list(services: ServiceFactory = Depends(get_services)):
-    return DialogListResponse(message=await services.chat.get_my_dialogs())
+async def get_dialog_list(
+        request: Request,
+        response: Response,
+        before: Optional[str] = None,
+        limit: Optional[int] = None,
+        services: ServiceFactory = Depends(get_services)
+):
+    etag = await services.chat.get_dialogs_etag(str(request.query_params))
+    if is_not_modified(request, etag):
+        return not_modified(etag)
+    set_etag(response, etag)
+    dialogs, next_cursor = await services.chat.get_my_dialogs(before=before, limit=limit)
+    return DialogListResponse(message=dialogs, next_cursor=next_cursor)
 
 
 @router.get("/open", response_model=DialogResponse, status_code=http_status.HTTP_200_OK)
@@ -27,16 +44,92 @@ async def open_dialog(message_id: uuid.UUID, services: ServiceFactory = Depends(
     await services.chat.mark_msg_as_read(message_id)
 
 
+@router.post("/{dialog_id}/read", status_code=http_status.HTTP_204_NO_CONTENT)
+async def read_dialog(
+        dialog_id: uuid.UUID,
+        message_id: Optional[uuid.UUID] = None,
+        services: ServiceFactory = Depends(get_services)
+):
+    await services.chat.read_dialog(dialog_id, message_id=message_id)
+
+
 @router.get("/unread_count", response_model=MessageCountResponse, status_code=http_status.HTTP_200_OK)
 async def chat_history(services: ServiceFactory = Depends(get_services)):
     return MessageCountResponse(message=await services.chat.get_unread_msg_count())
 
 
-@router.get("/{dialog_id}/history", response_model=MessageResponse, status_code=http_status.HTTP_200_OK)
-async def chat_history(dialog_id: uuid.UUID, services: ServiceFactory = Depends(get_services)):
-    return MessageResponse(message=await services.chat.get_message_history(dialog_id))
+@router.get("/search", response_model=MessageSearchResponse, status_code=http_status.HTTP_200_OK)
+async def search_messages(
+        q: str,
+        dialog_id: Optional[uuid.UUID] = None,
+        before: Optional[str] = None,
+        limit: Optional[int] = None,
+        services: ServiceFactory = Depends(get_services)
+):
+    hits, next_cursor = await services.chat.search_messages(q, chat_id=dialog_id, before=before, limit=limit)
+    return MessageSearchResponse(message=hits, next_cursor=next_cursor)
+
+
+@router.get(
+    "/{dialog_id}/history",
+    # Компактная страница возвращается в обход response_model (см. ниже),
+    # Union нужен только для схемы OpenAPI
+    response_model=Union[MessagePageResponse, CompactMessagePageResponse],
+    status_code=http_status.HTTP_200_OK
+)
+async def chat_history(
+        dialog_id: uuid.UUID,
+        request: Request,
+        response: Response,
+        before: Optional[str] = None,
+        after: Optional[str] = None,
+        limit: Optional[int] = None,
+        compact: bool = False,
+        services: ServiceFactory = Depends(get_services)
+):
+    etag = await services.chat.get_history_etag(dialog_id, str(request.query_params))
+    if is_not_modified(request, etag):
+        return not_modified(etag)
+    set_etag(response, etag)
+
+    if compact:
+        messages, participants, next_cursor = await services.chat.get_compact_message_history(
+            dialog_id,
+            before=before,
+            after=after,
+            limit=limit
+        )
+        page = CompactMessagePageResponse(message=messages, participants=participants, next_cursor=next_cursor)
+        # Пустая компактная страница подходит и под полную форму,
+        # и проверка Union отбросила бы participants
+        compact_response = Response(content=page.json(), media_type="application/json")
+        set_etag(compact_response, etag)
+        return compact_response
+
+    messages, next_cursor = await services.chat.get_message_history(dialog_id, before=before, after=after, limit=limit)
+    return MessagePageResponse(message=messages, next_cursor=next_cursor)
+
+
+@router.websocket("/ws")
+async def open_dialogs(websocket: WebSocket, compact: bool = False, services: ServiceFactory = Depends(get_services)):
+    await services.chat.subscribe_to_chats(websocket, compact=compact)
 
 
 @router.websocket("/{dialog_id}/ws")
-async def open_dialog(dialog_id: uuid.UUID, websocket: WebSocket, services: ServiceFactory = Depends(get_services)):
-    await services.chat.subscribe_to_chat(websocket, dialog_id)
+async def open_dialog(
+        dialog_id: uuid.UUID,
+        websocket: WebSocket,
+        heartbeat: bool = False,
+        last_message_id: Optional[uuid.UUID] = None,
+        offset: Optional[str] = None,
+        compact: bool = False,
+        services: ServiceFactory = Depends(get_services)
+):
+    await services.chat.subscribe_to_chat(
+        websocket,
+        dialog_id,
+        heartbeat=heartbeat,
+        last_message_id=last_message_id,
+        offset=offset,
+        compact=compact
+    )
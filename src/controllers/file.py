@@ -6,10 +6,11 @@ from fastapi import status as http_status
 from fastapi.responses import StreamingResponse, Response
 
 from src.dependencies.services import get_services
+from src.dependencies.unit_of_work import UnitOfWorkRoute
 from src.services import ServiceFactory
 from src.views.file import FileResponse
 
-router = APIRouter()
+router = APIRouter(route_class=UnitOfWorkRoute)
 
 
 @router.get("/download/{file_id}", status_code=http_status.HTTP_200_OK)
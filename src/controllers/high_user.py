@@ -4,10 +4,11 @@ from fastapi import APIRouter, Depends
 from fastapi import status as http_status
 
 from src.dependencies.services import get_services
+from src.dependencies.unit_of_work import UnitOfWorkRoute
 from src.models import schemas
 from src.services import ServiceFactory
 
-router = APIRouter()
+router = APIRouter(route_class=UnitOfWorkRoute)
 
 
 @router.post("/update_user", response_model=None, status_code=http_status.HTTP_204_NO_CONTENT)
@@ -31,3 +31,8 @@ async def test_redis(request: Request):
     return {
         "Redis": await request.app.state.redis.ping(),
     }
+
+
+@router.get("/chat_stats", response_model=dict, status_code=http_status.HTTP_200_OK)
+async def chat_stats(request: Request):
+    return request.app.state.chat_manager.stats()
@@ -1,16 +1,18 @@
 import uuid
+from typing import Optional
 
 from fastapi import APIRouter, Depends
 from fastapi import status as http_status
 
 from src.dependencies.services import get_services
+from src.dependencies.unit_of_work import UnitOfWorkRoute
 from src.models import schemas
 from src.services import ServiceFactory
 
 from src.views.user import UserSmallResponse, UserListResponse
 from src.views.user import UserBigResponse
 
-router = APIRouter()
+router = APIRouter(route_class=UnitOfWorkRoute)
 
 
 @router.get("/current", response_model=UserBigResponse, status_code=http_status.HTTP_200_OK)
@@ -29,8 +31,13 @@ async def update_my_password(data: schemas.UserPasswordUpdate, services: Service
 
 
 @router.get("/list", response_model=UserListResponse, status_code=http_status.HTTP_200_OK)
-async def get_users(service: ServiceFactory = Depends(get_services)):
-    return UserListResponse(message=await service.user.get_users())
+async def get_users(
+        after: Optional[str] = None,
+        limit: Optional[int] = None,
+        service: ServiceFactory = Depends(get_services)
+):
+    users, next_cursor = await service.user.get_users(after=after, limit=limit)
+    return UserListResponse(message=users, next_cursor=next_cursor)
 
 
 @router.get("/{user_id}", response_model=UserSmallResponse, status_code=http_status.HTTP_200_OK)
@@ -1,6 +1,9 @@
 import urllib.parse
-from typing import Tuple
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Iterator, Optional, Tuple
 
+from sqlalchemy import event
 from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine, AsyncEngine
 from sqlalchemy.orm import sessionmaker, declarative_base
 
@@ -24,7 +27,36 @@ def create_psql_async_session(
         echo=echo,
         future=True
     )
+    event.listen(engine.sync_engine, "before_cursor_execute", _count_query)
     return engine, sessionmaker(engine, class_=AsyncSession, expire_on_commit=False)
 
 
 Base = declarative_base()
+
+
+class QueryCounter:
+    def __init__(self):
+        self.count = 0
+
+
+_query_counter: ContextVar[Optional[QueryCounter]] = ContextVar("query_counter", default=None)
+
+
+@contextmanager
+def count_queries() -> Iterator[QueryCounter]:
+    """
+    Считает запросы к БД, выполненные внутри блока (в том числе в дочерних задачах)
+
+    """
+    counter = QueryCounter()
+    token = _query_counter.set(counter)
+    try:
+        yield counter
+    finally:
+        _query_counter.reset(token)
+
+
+def _count_query(*args) -> None:
+    counter = _query_counter.get()
+    if counter is not None:
+        counter.count += 1
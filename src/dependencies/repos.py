@@ -10,4 +10,8 @@ async def get_repos(request: Request = None, websocket: WebSocket = None) -> Rep
     else:
         app = websocket.app
     async with app.state.db_session() as session:
+        if request:
+            # Фиксируется одним commit в UnitOfWorkRoute, после него выполняется after_commit
+            request.state.db_session = session
+            request.state.after_commit = list()
         yield RepoFactory(session, debug=app.state.config.DEBUG)
@@ -12,9 +12,11 @@ async def get_services(
         websocket: WebSocket = None,
         repos: RepoFactory = Depends(get_repos)
 ) -> ServiceFactory:
+    after_commit = None
     if request:
         app = request.app
         scope = request.scope
+        after_commit = request.state.after_commit
     else:
         app = websocket.app
         scope = websocket.scope
@@ -26,5 +28,10 @@ async def get_services(
         redis_client=app.state.redis,
         chat_manager=app.state.chat_manager,
         file_storage=app.state.file_storage,
+        message_writer=app.state.message_writer,
+        chat_versions=app.state.chat_versions,
+        unread_counters=app.state.unread_counters,
+        chat_membership=app.state.chat_membership,
+        after_commit=after_commit,
         debug=app.state.config.DEBUG,
     )
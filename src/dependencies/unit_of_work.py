@@ -0,0 +1,47 @@
+import logging
+from typing import Callable, Coroutine, Any
+
+from fastapi.requests import Request
+from fastapi.responses import Response
+from fastapi.routing import APIRoute
+
+log = logging.getLogger(__name__)
+
+
+class UnitOfWorkRoute(APIRoute):
+    """
+    Один commit на запрос
+
+    Репозитории не фиксируют изменения сами: сессия запроса (см. get_repos)
+    фиксируется здесь, после обработчика и до отправки ответа, а при исключении
+    откатывается. Так клиент не получит успешный ответ на незафиксированные изменения.
+
+    Побочные эффекты вне БД (штампы версий, счётчики redis, события брокера) сервисы
+    откладывают в request.state.after_commit: они выполняются только после commit,
+    чтобы никто не увидел их раньше изменений, от которых они зависят, а при откате
+    не выполняются вовсе.
+    """
+
+    def get_route_handler(self) -> Callable[[Request], Coroutine[Any, Any, Response]]:
+        handler = super().get_route_handler()
+
+        async def route_handler(request: Request) -> Response:
+            try:
+                response = await handler(request)
+            except Exception:
+                session = getattr(request.state, "db_session", None)
+                if session is not None:
+                    await session.rollback()
+                raise
+            session = getattr(request.state, "db_session", None)
+            if session is not None:
+                await session.commit()
+            for callback in getattr(request.state, "after_commit", ()):
+                try:
+                    await callback()
+                except Exception as ex:
+                    # Изменения уже зафиксированы, ответ не должен от этого зависеть
+                    log.exception("Ошибка действия после commit", exc_info=ex)
+            return response
+
+        return route_handler
@@ -1,2 +1,3 @@
 from .jwt import JWTMiddlewareHTTP
 from .jwt import JWTMiddlewareWS
+from .query_count import QueryCountMiddleware
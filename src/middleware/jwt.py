@@ -149,6 +149,9 @@ class JWTMiddlewareWS:
 
         # ----- pre_process -----
         # Проверка авторизации
+        # При истекшем access-токене подключение авторизуется по действующей сессии.
+        # Новые токены в куки не попадают (ответить Set-Cookie ws не может), поэтому
+        # сессия в redis не меняется, а браузер обновит токены при следующем http-запросе.
         await jwt_pre_process(
             current_tokens=current_tokens,
             jwt=jwt,
@@ -157,8 +160,7 @@ class JWTMiddlewareWS:
             db_session=db_session,
             req_obj=websocket,
             is_need_update=is_need_update,
-            is_auth=is_auth,
-            disable_update=True
+            is_auth=is_auth
         )
 
         # ----- process -----
@@ -0,0 +1,28 @@
+from starlette.datastructures import MutableHeaders
+
+from src.db import count_queries
+
+
+class QueryCountMiddleware:
+    """
+    Добавляет в ответ заголовок X-Query-Count - кол-во запросов к БД,
+    выполненных при обработке запроса
+
+    """
+    HEADER = "X-Query-Count"
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        with count_queries() as counter:
+            async def send_with_count(message):
+                if message["type"] == "http.response.start":
+                    MutableHeaders(scope=message)[self.HEADER] = str(counter.count)
+                await send(message)
+
+            await self.app(scope, receive, send_with_count)
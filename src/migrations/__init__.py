@@ -0,0 +1 @@
+from .runner import HEAD, SchemaVersionError, check, current_version, upgrade
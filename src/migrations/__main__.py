@@ -0,0 +1,40 @@
+"""
+Миграции схемы БД
+
+Выполняются отдельным шагом перед запуском приложения (один раз на выкладку,
+а не в каждом воркере); воркер при старте только сверяет версию схемы.
+
+    python -m src.migrations upgrade  # применить недостающие ревизии
+    python -m src.migrations current  # показать версию схемы БД
+"""
+import argparse
+import asyncio
+import logging
+
+from src.migrations.runner import HEAD, current_version, engine_from_config, upgrade
+
+
+async def run(command: str) -> None:
+    engine = engine_from_config()
+    try:
+        if command == "upgrade":
+            applied = await upgrade(engine)
+            logging.info(f"Применено ревизий: {len(applied)}, версия схемы {HEAD}")
+        else:
+            async with engine.connect() as conn:
+                print(f"{await current_version(conn)} (в коде {HEAD})")
+    finally:
+        await engine.dispose()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("command", choices=["upgrade", "current"])
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    asyncio.run(run(args.command))
+
+
+if __name__ == "__main__":
+    main()
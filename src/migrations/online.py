@@ -0,0 +1,86 @@
+"""
+Создание индексов на работающей БД без блокировки записи
+
+Индексы описаны в моделях (src.models.tables), а ревизии миграций строят их здесь
+через CREATE INDEX CONCURRENTLY: по одному и вне транзакции (autocommit), как того
+требует Postgres. Индекс, оставшийся невалидным после прерванной сборки,
+удаляется и строится заново.
+
+    python -m src.migrations.online  # все недостающие индексы моделей
+"""
+import asyncio
+import logging
+import re
+from typing import Iterable, Optional
+
+from sqlalchemy import Index, text
+from sqlalchemy.dialects import postgresql
+from sqlalchemy.ext.asyncio import AsyncConnection
+from sqlalchemy.schema import CreateIndex
+
+from src.models import tables
+
+log = logging.getLogger(__name__)
+
+
+def metadata_indexes() -> list[Index]:
+    """
+    Все индексы моделей, в порядке зависимостей таблиц
+
+    """
+    return [
+        index
+        for table in tables.Base.metadata.sorted_tables
+        for index in sorted(table.indexes, key=lambda index: index.name)
+    ]
+
+
+def create_index_sql(index: Index) -> str:
+    sql = str(CreateIndex(index).compile(dialect=postgresql.dialect()))
+    return re.sub(r"^CREATE (UNIQUE )?INDEX ", r"CREATE \1INDEX CONCURRENTLY ", sql)
+
+
+async def create_indexes(conn: AsyncConnection, indexes: Optional[Iterable[Index]] = None) -> list[str]:
+    """
+    Построить недостающие индексы без блокировки таблиц
+
+    :param conn: подключение в режиме autocommit
+    :param indexes: по умолчанию - все индексы моделей
+    :return: имена построенных индексов
+    """
+    created = list()
+    for index in indexes if indexes is not None else metadata_indexes():
+        is_valid = (await conn.execute(
+            text(
+                "SELECT i.indisvalid FROM pg_index i JOIN pg_class c ON c.oid = i.indexrelid "
+                "WHERE c.relname = :name"
+            ),
+            dict(name=index.name)
+        )).scalar()
+        if is_valid:
+            continue
+        if is_valid is False:
+            log.warning(f"Индекс {index.name} невалиден (прерванная сборка), пересоздание")
+            await conn.exec_driver_sql(f'DROP INDEX CONCURRENTLY IF EXISTS "{index.name}"')
+
+        log.info(f"Построение индекса {index.name}")
+        await conn.exec_driver_sql(create_index_sql(index))
+        created.append(index.name)
+    return created
+
+
+async def main() -> None:
+    from src.migrations.runner import engine_from_config
+
+    engine = engine_from_config()
+    try:
+        async with engine.connect() as conn:
+            created = await create_indexes(await conn.execution_options(isolation_level="AUTOCOMMIT"))
+    finally:
+        await engine.dispose()
+    log.info(f"Построено индексов: {len(created)}")
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    asyncio.run(main())
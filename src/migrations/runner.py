@@ -0,0 +1,130 @@
+import importlib
+import logging
+import os
+import pkgutil
+from types import ModuleType
+
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import AsyncConnection, AsyncEngine
+
+from src.config import load_consul_config
+from src.db import create_psql_async_session
+from src.migrations import versions
+
+log = logging.getLogger(__name__)
+
+VERSION_TABLE = "schema_version"
+# Ключ pg_advisory_lock: одновременно запущенные миграции выполняются по очереди
+LOCK_KEY = 2023_0001
+
+
+class SchemaVersionError(Exception):
+    pass
+
+
+def load_revisions() -> list[ModuleType]:
+    """
+    Ревизии из src.migrations.versions, по возрастанию номера
+
+    Модуль ревизии определяет revision (номер), description, transactional
+    (False - выполняется вне транзакции, например для CREATE INDEX CONCURRENTLY)
+    и корутину upgrade(conn).
+    """
+    modules = [
+        importlib.import_module(f"{versions.__name__}.{info.name}")
+        for info in pkgutil.iter_modules(versions.__path__)
+    ]
+    modules.sort(key=lambda module: module.revision)
+    numbers = [module.revision for module in modules]
+    if numbers != list(range(1, len(numbers) + 1)):
+        raise SchemaVersionError(f"Номера ревизий должны идти подряд с 1: {numbers}")
+    return modules
+
+
+REVISIONS = load_revisions()
+HEAD = REVISIONS[-1].revision if REVISIONS else 0
+
+
+async def current_version(conn: AsyncConnection) -> int:
+    """
+    Версия схемы БД, 0 - миграции ещё не применялись
+
+    """
+    if not (await conn.execute(text("SELECT to_regclass(:name)"), dict(name=VERSION_TABLE))).scalar():
+        return 0
+    return (await conn.execute(text(f"SELECT coalesce(max(version), 0) FROM {VERSION_TABLE}"))).scalar()
+
+
+async def upgrade(engine: AsyncEngine) -> list[int]:
+    """
+    Применить недостающие ревизии
+
+    Выполняется под pg_advisory_lock, поэтому параллельный запуск дождётся
+    окончания первого и ничего не применит повторно.
+
+    :return: номера применённых ревизий
+    """
+    applied = list()
+    async with engine.connect() as lock_conn:
+        lock_conn = await lock_conn.execution_options(isolation_level="AUTOCOMMIT")
+        await lock_conn.execute(text("SELECT pg_advisory_lock(:key)"), dict(key=LOCK_KEY))
+        try:
+            async with engine.begin() as conn:
+                await conn.exec_driver_sql(
+                    f"CREATE TABLE IF NOT EXISTS {VERSION_TABLE} ("
+                    "version INTEGER PRIMARY KEY, "
+                    "description VARCHAR(255) NOT NULL, "
+                    "applied_at TIMESTAMP WITH TIME ZONE NOT NULL DEFAULT now())"
+                )
+                version = await current_version(conn)
+
+            for module in REVISIONS:
+                if module.revision <= version:
+                    continue
+                log.info(f"Применение ревизии {module.revision} ({module.description})")
+                if module.transactional:
+                    async with engine.begin() as conn:
+                        await module.upgrade(conn)
+                        await _record(conn, module)
+                else:
+                    async with engine.connect() as conn:
+                        conn = await conn.execution_options(isolation_level="AUTOCOMMIT")
+                        await module.upgrade(conn)
+                        await _record(conn, module)
+                applied.append(module.revision)
+        finally:
+            await lock_conn.execute(text("SELECT pg_advisory_unlock(:key)"), dict(key=LOCK_KEY))
+    return applied
+
+
+async def check(engine: AsyncEngine) -> None:
+    """
+    Проверить, что схема БД соответствует коду
+
+    :raises SchemaVersionError: если миграции не применены (или БД новее кода)
+    """
+    async with engine.connect() as conn:
+        version = await current_version(conn)
+    if version != HEAD:
+        raise SchemaVersionError(
+            f"Версия схемы БД {version}, ожидается {HEAD}: выполните python -m src.migrations upgrade"
+        )
+
+
+def engine_from_config() -> AsyncEngine:
+    config = load_consul_config(os.getenv('CONSUL_ROOT', "hackathon-2023-1-dev"), host="192.168.3.41")
+    engine, _ = create_psql_async_session(
+        username=config.DB.POSTGRESQL.USERNAME,
+        password=config.DB.POSTGRESQL.PASSWORD,
+        host=config.DB.POSTGRESQL.HOST,
+        port=config.DB.POSTGRESQL.PORT,
+        database=config.DB.POSTGRESQL.DATABASE
+    )
+    return engine
+
+
+async def _record(conn: AsyncConnection, module: ModuleType) -> None:
+    await conn.execute(
+        text(f"INSERT INTO {VERSION_TABLE} (version, description) VALUES (:version, :description)"),
+        dict(version=module.revision, description=module.description)
+    )
@@ -0,0 +1,82 @@
+"""
+Исходная схема: таблицы в том виде, в каком их создавал create_all до миграций
+
+На существующей БД ничего не меняет (IF NOT EXISTS).
+"""
+from sqlalchemy.ext.asyncio import AsyncConnection
+
+revision = 1
+description = "baseline"
+transactional = True
+
+STATEMENTS = [
+    """
+    DO $$ BEGIN
+        CREATE TYPE userrole AS ENUM ('GUEST', 'BANNED', 'USER', 'HIGH_USER', 'ADMIN');
+    EXCEPTION WHEN duplicate_object THEN NULL;
+    END $$
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS users (
+        id UUID PRIMARY KEY,
+        email VARCHAR(255) NOT NULL UNIQUE,
+        avatar_id UUID,
+        first_name VARCHAR(64) NOT NULL,
+        last_name VARCHAR(64) NOT NULL,
+        patronymic VARCHAR(64),
+        department VARCHAR(255) NOT NULL,
+        job_title VARCHAR(255) NOT NULL,
+        hashed_password VARCHAR(255) NOT NULL,
+        role userrole,
+        create_at TIMESTAMP WITH TIME ZONE DEFAULT now(),
+        update_at TIMESTAMP WITH TIME ZONE
+    )
+    """,
+    "CREATE TABLE IF NOT EXISTS chats (id UUID PRIMARY KEY)",
+    """
+    CREATE TABLE IF NOT EXISTS user_chat (
+        user_id UUID NOT NULL REFERENCES users (id),
+        chat_id UUID NOT NULL REFERENCES chats (id),
+        PRIMARY KEY (user_id, chat_id)
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS messages (
+        id UUID PRIMARY KEY,
+        text VARCHAR(1024),
+        chat_id UUID NOT NULL REFERENCES chats (id),
+        owner_id UUID NOT NULL REFERENCES users (id),
+        is_read BOOLEAN,
+        create_at TIMESTAMP WITH TIME ZONE DEFAULT now(),
+        update_at TIMESTAMP WITH TIME ZONE
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS files (
+        id UUID PRIMARY KEY,
+        file_name VARCHAR(255),
+        message_id UUID REFERENCES messages (id)
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS banners (
+        id UUID PRIMARY KEY,
+        file_id UUID,
+        create_at TIMESTAMP WITH TIME ZONE DEFAULT now()
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS articles (
+        id UUID PRIMARY KEY,
+        title VARCHAR(255) NOT NULL,
+        text VARCHAR(10000) NOT NULL,
+        create_at TIMESTAMP WITH TIME ZONE DEFAULT now(),
+        update_at TIMESTAMP WITH TIME ZONE
+    )
+    """,
+]
+
+
+async def upgrade(conn: AsyncConnection) -> None:
+    for statement in STATEMENTS:
+        await conn.exec_driver_sql(statement)
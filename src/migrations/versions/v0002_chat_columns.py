@@ -0,0 +1,76 @@
+"""
+Колонки чата: отметка прочтения, сводка диалога, ключ личного диалога
+
+Поисковый вектор сообщений - отдельная ревизия 4: messages слишком велика,
+чтобы менять её в этой транзакции.
+
+Ключ личного диалога заполняется по существующим связям user_chat. Если у пары
+пользователей уже есть несколько диалогов, ключ получает только самый новый из них
+(по последнему сообщению), остальные остаются доступны по ссылке.
+"""
+from sqlalchemy.ext.asyncio import AsyncConnection
+
+revision = 2
+description = "chat columns"
+transactional = True
+
+STATEMENTS = [
+    "ALTER TABLE user_chat ADD COLUMN IF NOT EXISTS last_read_at TIMESTAMP WITH TIME ZONE",
+    """
+    ALTER TABLE user_chat
+        ADD COLUMN IF NOT EXISTS last_activity_at TIMESTAMP WITH TIME ZONE NOT NULL DEFAULT now()
+    """,
+    """
+    ALTER TABLE chats
+        ADD COLUMN IF NOT EXISTS last_message_id UUID,
+        ADD COLUMN IF NOT EXISTS last_message_at TIMESTAMP WITH TIME ZONE,
+        ADD COLUMN IF NOT EXISTS last_message_preview VARCHAR(100),
+        ADD COLUMN IF NOT EXISTS user_low UUID,
+        ADD COLUMN IF NOT EXISTS user_high UUID
+    """,
+    # Сводка диалога и время активности по последнему сообщению
+    """
+    UPDATE chats SET
+        last_message_id = m.id,
+        last_message_at = m.create_at,
+        last_message_preview = left(m.text, 100)
+    FROM (
+        SELECT DISTINCT ON (chat_id) chat_id, id, create_at, text
+        FROM messages
+        ORDER BY chat_id, create_at DESC, id DESC
+    ) m
+    WHERE chats.id = m.chat_id AND chats.last_message_id IS NULL
+    """,
+    """
+    UPDATE user_chat SET last_activity_at = chats.last_message_at
+    FROM chats
+    WHERE chats.id = user_chat.chat_id AND chats.last_message_at IS NOT NULL
+    """,
+    # Ключ личного диалога: по одному (самому недавнему) диалогу на пару
+    """
+    UPDATE chats SET user_low = p.ids[1], user_high = p.ids[2]
+    FROM (
+        SELECT DISTINCT ON (ids) chat_id, ids
+        FROM (
+            SELECT uc.chat_id, array_agg(uc.user_id ORDER BY uc.user_id) AS ids
+            FROM user_chat uc
+            GROUP BY uc.chat_id
+            HAVING count(*) = 2
+        ) pairs
+        JOIN chats c ON c.id = pairs.chat_id
+        ORDER BY ids, c.last_message_at DESC NULLS LAST
+    ) p
+    WHERE chats.id = p.chat_id AND chats.user_low IS NULL
+    """,
+    """
+    DO $$ BEGIN
+        ALTER TABLE chats ADD CONSTRAINT uq_chats_user_low_user_high UNIQUE (user_low, user_high);
+    EXCEPTION WHEN duplicate_object OR duplicate_table THEN NULL;
+    END $$
+    """,
+]
+
+
+async def upgrade(conn: AsyncConnection) -> None:
+    for statement in STATEMENTS:
+        await conn.exec_driver_sql(statement)
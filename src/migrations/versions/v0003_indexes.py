@@ -0,0 +1,25 @@
+"""
+Индексы чата, пользователей и вложений
+
+Строятся через CREATE INDEX CONCURRENTLY, поэтому ревизия выполняется вне транзакции.
+"""
+from sqlalchemy.ext.asyncio import AsyncConnection
+
+from src.migrations.online import create_indexes, metadata_indexes
+
+revision = 3
+description = "indexes"
+transactional = False
+
+INDEXES = (
+    "ix_messages_chat_id_create_at_id",
+    "ix_messages_chat_id_owner_id_unread",
+    "ix_files_message_id",
+    "ix_users_email_lower",
+    "ix_user_chat_user_id_last_activity_at",
+    "ix_user_chat_chat_id",
+)
+
+
+async def upgrade(conn: AsyncConnection) -> None:
+    await create_indexes(conn, [index for index in metadata_indexes() if index.name in INDEXES])
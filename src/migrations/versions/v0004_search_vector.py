@@ -0,0 +1,105 @@
+"""
+Поисковый вектор сообщений: колонка, триггер, заполнение и GIN-индекс
+
+Генерируемая колонка (GENERATED ... STORED) переписала бы всю messages под
+ACCESS EXCLUSIVE, и запись в чаты стояла бы до конца перезаписи. Поэтому:
+
+- колонка добавляется пустой (nullable, без default) - меняются только метаданные;
+- новые и изменённые сообщения получают вектор из триггера;
+- существующие сообщения заполняются пачками по BATCH_SIZE, каждая пачка - своя
+  короткая транзакция (autocommit); после прерывания миграция запускается заново
+  и обновляет только строки с ещё пустым вектором;
+- GIN-индекс строится через CREATE INDEX CONCURRENTLY после заполнения.
+
+Пока заполнение идёт, ещё не заполненные сообщения просто не находятся поиском.
+"""
+import logging
+
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import AsyncConnection
+
+from src.migrations.online import create_indexes, metadata_indexes
+
+revision = 4
+description = "message search vector"
+transactional = False
+
+log = logging.getLogger(__name__)
+
+BATCH_SIZE = 10_000
+# ADD COLUMN всё равно ждёт ACCESS EXCLUSIVE: не вставать в очередь за долгими
+# транзакциями, блокируя всех за собой, а упасть и повторить миграцию позже
+LOCK_TIMEOUT = "5s"
+
+VECTOR = "to_tsvector('russian', coalesce({0}, '')) || to_tsvector('simple', coalesce({0}, ''))"
+
+STATEMENTS = [
+    f"SET lock_timeout = '{LOCK_TIMEOUT}'",
+    "ALTER TABLE messages ADD COLUMN IF NOT EXISTS search_vector TSVECTOR",
+    # БД, где колонка уже была генерируемой: снять выражение, сохранив значения
+    """
+    DO $$ BEGIN
+        IF EXISTS (
+            SELECT 1 FROM pg_attribute
+            WHERE attrelid = 'messages'::regclass AND attname = 'search_vector' AND attgenerated = 's'
+        ) THEN
+            ALTER TABLE messages ALTER COLUMN search_vector DROP EXPRESSION;
+        END IF;
+    END $$
+    """,
+    f"""
+    CREATE OR REPLACE FUNCTION messages_search_vector_update() RETURNS trigger AS $$
+    BEGIN
+        NEW.search_vector := {VECTOR.format("NEW.text")};
+        RETURN NEW;
+    END
+    $$ LANGUAGE plpgsql
+    """,
+    "DROP TRIGGER IF EXISTS messages_search_vector_update ON messages",
+    """
+    CREATE TRIGGER messages_search_vector_update
+        BEFORE INSERT OR UPDATE OF text ON messages
+        FOR EACH ROW EXECUTE FUNCTION messages_search_vector_update()
+    """,
+    "RESET lock_timeout",
+]
+
+
+async def backfill(conn: AsyncConnection) -> int:
+    """
+    Заполнить вектор существующих сообщений пачками по первичному ключу
+
+    :param conn: подключение в режиме autocommit
+    :return: кол-во заполненных сообщений
+    """
+    total = 0
+    after = None
+    while True:
+        start = "id > :after" if after else "TRUE"
+        last = (await conn.execute(
+            # Последний id пачки (для uuid нет агрегата max)
+            text(
+                f"SELECT id FROM (SELECT id FROM messages WHERE {start} ORDER BY id LIMIT :limit) batch "
+                "ORDER BY id DESC LIMIT 1"
+            ),
+            dict(after=after, limit=BATCH_SIZE) if after else dict(limit=BATCH_SIZE)
+        )).scalar()
+        if last is None:
+            return total
+        result = await conn.execute(
+            text(
+                f"UPDATE messages SET search_vector = {VECTOR.format('text')} "
+                f"WHERE {start} AND id <= :last AND search_vector IS NULL"
+            ),
+            dict(after=after, last=last) if after else dict(last=last)
+        )
+        total += result.rowcount
+        after = last
+        log.info(f"Поисковый вектор: заполнено {total} сообщений (до id {last})")
+
+
+async def upgrade(conn: AsyncConnection) -> None:
+    for statement in STATEMENTS:
+        await conn.exec_driver_sql(statement)
+    await backfill(conn)
+    await create_indexes(conn, [index for index in metadata_indexes() if index.name == "ix_messages_search_vector"])
@@ -1,2 +1,3 @@
 from .role import UserRole
 from .error import ErrorType
+from .chat import ChatCommandType, ChatEventType
@@ -0,0 +1,27 @@
+from enum import Enum, unique
+
+
+@unique
+class ChatCommandType(str, Enum):
+    """
+    Типы входящих кадров мультиплексированного ws
+    """
+    SUBSCRIBE = "subscribe"
+    UNSUBSCRIBE = "unsubscribe"
+    MESSAGE = "message"
+    REFRESH = "refresh"
+    PONG = "pong"
+
+
+@unique
+class ChatEventType(str, Enum):
+    """
+    Типы исходящих событий чата
+    """
+    MESSAGE = "message"
+    DIALOG_CREATED = "dialog_created"
+    SUBSCRIBED = "subscribed"
+    UNSUBSCRIBED = "unsubscribed"
+    REFRESHED = "refreshed"
+    PING = "ping"
+    ERROR = "error"
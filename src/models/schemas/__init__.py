@@ -14,6 +14,7 @@ from .user import UserPasswordUpdate
 
 from .message import MessageInput
 from .message import MessageFileInclusion
+from .message import ChatCommand
 
 from .article import Article
 from .article import ArticleUpdate
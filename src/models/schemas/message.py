@@ -3,8 +3,9 @@ import re
 from datetime import datetime
 from typing import Optional
 
-from pydantic import BaseModel, validator
+from pydantic import BaseModel, Field, validator
 
+from src.models.enums.chat import ChatCommandType
 from src.models.schemas.user import UserSmall
 from src.models.schemas.file import File
 
@@ -30,5 +31,26 @@ class MessageFileInclusion(BaseModel):
 
 
 class MessageInput(BaseModel):
-    text: Optional[str]
+    # Не длиннее messages.text: отложенная запись не должна получить строку, которую не сохранит
+    text: Optional[str] = Field(None, max_length=1024)
     files: list[uuid.UUID]
+
+
+class ChatCommand(BaseModel):
+    """
+    Входящий кадр мультиплексированного ws
+    """
+    # Каждый id подписки - проверка доступа и подписка в брокере
+    MAX_CHAT_IDS = 200
+
+    type: ChatCommandType
+    chat_ids: list[uuid.UUID] = []
+    chat_id: Optional[uuid.UUID]
+    text: Optional[str]
+    files: list[uuid.UUID] = []
+
+    @validator('chat_ids')
+    def chat_ids_must_be_limited(cls, value):
+        if len(value) > cls.MAX_CHAT_IDS:
+            raise ValueError(f"Не больше {cls.MAX_CHAT_IDS} диалогов в одной команде")
+        return value
@@ -1,6 +1,6 @@
 import uuid
 
-from sqlalchemy import Column, String, Enum, DateTime, func, Text
+from sqlalchemy import Column, String, Enum, DateTime, func, Text, UniqueConstraint
 
 from sqlalchemy import UUID
 from sqlalchemy.orm import relationship
@@ -10,9 +10,20 @@ from src.db import Base
 
 class Chat(Base):
     __tablename__ = "chats"
-    __table_args__ = {'extend_existing': True}
+    __table_args__ = (
+        # Личный диалог двух пользователей единственен: ключ - упорядоченная пара их id
+        UniqueConstraint("user_low", "user_high", name="uq_chats_user_low_user_high"),
+        {'extend_existing': True}
+    )
 
     id = Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
+    # Участники личного диалога, user_low < user_high
+    user_low = Column(UUID(as_uuid=True), nullable=True)
+    user_high = Column(UUID(as_uuid=True), nullable=True)
+    # Сводка для списка диалогов, обновляется в транзакции записи сообщения
+    last_message_id = Column(UUID(as_uuid=True), nullable=True)
+    last_message_at = Column(DateTime(timezone=True), nullable=True)
+    last_message_preview = Column(String(100), nullable=True)
     messages = relationship("models.tables.message.Message", back_populates="chat")
     users = relationship("models.tables.user_chat.UserChatAssociation", back_populates="chat")
 
@@ -1,6 +1,6 @@
 import uuid
 
-from sqlalchemy import Column, String, Enum, DateTime, func, Text, ForeignKey
+from sqlalchemy import Column, String, Enum, DateTime, func, Text, ForeignKey, Index
 
 from sqlalchemy import UUID
 from sqlalchemy.orm import relationship
@@ -10,7 +10,11 @@ from src.db import Base
 
 class File(Base):
     __tablename__ = "files"
-    __table_args__ = {'extend_existing': True}
+    __table_args__ = (
+        # Вложения страницы истории и привязка к сообщению
+        Index("ix_files_message_id", "message_id"),
+        {'extend_existing': True}
+    )
 
     id = Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
     file_name = Column(String(255), default="file")
@@ -1,19 +1,36 @@
 import uuid
 
-from sqlalchemy import Column, String, Enum, DateTime, func, Text, Boolean, ForeignKey
+from sqlalchemy import Column, String, Enum, DateTime, func, Text, Boolean, ForeignKey, Index, text
 
 from sqlalchemy import UUID
-from sqlalchemy.orm import relationship
+from sqlalchemy.dialects.postgresql import TSVECTOR
+from sqlalchemy.orm import relationship, deferred
 
 from src.db import Base
 
 
 class Message(Base):
     __tablename__ = "messages"
-    __table_args__ = {'extend_existing': True}
+    __table_args__ = (
+        # Keyset-пагинация истории диалога по (create_at, id)
+        Index("ix_messages_chat_id_create_at_id", "chat_id", "create_at", "id"),
+        # Подсчёт непрочитанных: только ещё не прочитанные сообщения, create_at - для отметки прочтения
+        Index(
+            "ix_messages_chat_id_owner_id_unread",
+            "chat_id", "owner_id", "create_at",
+            postgresql_where=text("NOT is_read")
+        ),
+        # Полнотекстовый поиск по сообщениям
+        Index("ix_messages_search_vector", "search_vector", postgresql_using="gin"),
+        {'extend_existing': True}
+    )
 
     id = Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
     text = Column(String(1024), nullable=True)
+    # Русская морфология плюс точные словоформы (имена, термины, латиница). Заполняется
+    # триггером БД (ревизия v0004_search_vector), а не генерируемой колонкой: её добавление
+    # переписало бы всю таблицу. Отложенная загрузка - вектор не нужен нигде, кроме условия поиска
+    search_vector = deferred(Column(TSVECTOR, nullable=True))
 
     chat_id = Column(UUID(as_uuid=True), ForeignKey("chats.id"), nullable=False)
     chat = relationship("models.tables.chat.Chat", back_populates="messages")
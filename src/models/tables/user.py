@@ -1,6 +1,6 @@
 import uuid
 
-from sqlalchemy import Column, String, Enum, DateTime, func, Text
+from sqlalchemy import Column, String, Enum, DateTime, func, Text, Index
 
 from sqlalchemy import UUID
 from sqlalchemy.orm import relationship
@@ -32,3 +32,7 @@ class User(Base):
 
     def __repr__(self):
         return f'<{self.__class__.__name__}: {self.id}>'
+
+
+# Вход без учёта регистра (UserRepo.get_by_email_insensitive)
+Index("ix_users_email_lower", func.lower(User.email))
@@ -2,15 +2,25 @@ from sqlalchemy.orm import relationship
 
 from src.db import Base
 
-from sqlalchemy import Column, ForeignKey
+from sqlalchemy import Column, ForeignKey, DateTime, Index, func
 
 from sqlalchemy import UUID
 
 
 class UserChatAssociation(Base):
     __tablename__ = "user_chat"
+    __table_args__ = (
+        # Список диалогов пользователя от недавних к старым (keyset по (last_activity_at, chat_id))
+        Index("ix_user_chat_user_id_last_activity_at", "user_id", "last_activity_at", "chat_id"),
+        # Участники диалога: первичный ключ начинается с user_id и здесь не помогает
+        Index("ix_user_chat_chat_id", "chat_id"),
+    )
     user_id = Column(UUID(as_uuid=True), ForeignKey("users.id"), nullable=False, primary_key=True)
     chat_id = Column(UUID(as_uuid=True), ForeignKey("chats.id"), nullable=False, primary_key=True)
+    # Пользователь прочитал все сообщения диалога, созданные не позже этого момента
+    last_read_at = Column(DateTime(timezone=True), nullable=True)
+    # Время последнего сообщения диалога (или его создания) - ключ сортировки списка диалогов
+    last_activity_at = Column(DateTime(timezone=True), nullable=False, server_default=func.now())
 
     user = relationship("models.tables.user.User", back_populates="chats")
     chat = relationship("models.tables.chat.Chat", back_populates="users")
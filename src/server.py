@@ -0,0 +1,52 @@
+"""
+Запуск приложения под uvicorn с мягкой остановкой сокетов чата
+
+При остановке uvicorn сам закрывает все подключения (websocket - с кодом 1012),
+дожидается их завершения и только потом вызывает обработчики shutdown приложения.
+Поэтому сокеты чата закрываются с кодом 1001, дослав очереди, раньше - здесь.
+
+Принимает те же аргументы, что и командная строка uvicorn (--workers,
+--proxy-headers, --forwarded-allow-ips, --root-path, ...):
+
+    python -m src.server src.app:app --proxy-headers --host 0.0.0.0 --port 80
+"""
+import importlib
+
+import uvicorn
+
+
+class Server(uvicorn.Server):
+    async def shutdown(self, sockets=None) -> None:
+        # Новые подключения больше не принимаются, пока закрываются текущие
+        for server in self.servers:
+            server.close()
+        chat_manager = getattr(getattr(self._application(), "state", None), "chat_manager", None)
+        if chat_manager is not None:
+            await chat_manager.drain()
+        await super().shutdown(sockets=sockets)
+
+    def _application(self):
+        # Приложение под middleware, которыми его оборачивает uvicorn
+        app = self.config.loaded_app
+        while app is not None and not hasattr(app, "state"):
+            app = getattr(app, "app", None)
+        return app
+
+
+def run(app, **kwargs) -> None:
+    """
+    Аналог uvicorn.run для объекта приложения (не строки импорта)
+
+    """
+    Server(uvicorn.Config(app, **kwargs)).run()
+
+
+def main():
+    # Командная строка uvicorn как есть, но с этим Server - в том числе в каждом из --workers
+    uvicorn_main = importlib.import_module("uvicorn.main")
+    uvicorn_main.Server = Server
+    uvicorn_main.main()
+
+
+if __name__ == "__main__":
+    main()
@@ -17,6 +17,11 @@ class ServiceFactory:
             config, redis_client,
             chat_manager,
             file_storage,
+            message_writer=None,
+            chat_versions=None,
+            unread_counters=None,
+            chat_membership=None,
+            after_commit: list = None,
             debug: bool = True
     ):
         self._repo = repo_factory
@@ -25,6 +30,11 @@ class ServiceFactory:
         self._redis_client = redis_client
         self._chat_manager = chat_manager
         self._file_storage = file_storage
+        self._message_writer = message_writer
+        self._chat_versions = chat_versions
+        self._unread_counters = unread_counters
+        self._chat_membership = chat_membership
+        self._after_commit = after_commit
         self._debug = debug
 
     @property
@@ -50,7 +60,14 @@ class ServiceFactory:
             chat_manager=self._chat_manager,
             current_user=self._current_user,
             message_repo=self._repo.message,
-            file_repo=self._repo.file
+            file_repo=self._repo.file,
+            message_writer=self._message_writer,
+            versions=self._chat_versions,
+            unread=self._unread_counters,
+            membership=self._chat_membership,
+            after_commit=self._after_commit,
+            jwt=auth.JWTManager(config=self._config, debug=self._debug),
+            session=auth.SessionManager(redis_client=self._redis_client, config=self._config, debug=self._debug)
         )
 
     @property
@@ -3,7 +3,7 @@ from typing import Optional
 
 from sqlalchemy.sql import roles
 
-from src.exceptions import NotFound
+from src.exceptions import NotFound, BadRequest
 from src.models import tables, schemas
 from src.models.enums import UserRole
 from src.services.auth import filters
@@ -28,8 +28,21 @@ class ArticleApplicationService:
         return schemas.Article.from_orm(article)
 
     @filters(roles=[UserRole.ADMIN, UserRole.HIGH_USER, UserRole.USER])
-    async def get_article_list_range(self, count: int):
-        return await self._repo.get_range(count, column=self._repo.table.create_at)
+    async def get_article_list_range(
+            self,
+            count: Optional[int] = None,
+            after: Optional[str] = None
+    ) -> tuple[list[tables.Article], Optional[str]]:
+        """
+        Страница статей от новых к старым
+
+        :param count: размер страницы, не больше ArticleRepo.MAX_PAGE_SIZE
+        :param after: next_cursor предыдущей страницы
+        """
+        try:
+            return await self._repo.get_page(count, order_by="create_at", descending=True, after=after)
+        except ValueError as error:
+            raise BadRequest(str(error))
 
     @filters(roles=[UserRole.ADMIN])
     async def create_article(self, article: schemas.CreateArticle) -> uuid.UUID:
@@ -78,6 +78,17 @@ class SessionManager:
             path=self.COOKIE_PATH
         )
 
+    async def get_refresh_token(self, session_id: int | str) -> Optional[str]:
+        """
+        Возвращает актуальный refresh-токен сессии
+
+        :param session_id:
+        :return: refresh-токен или None, если сессия не существует
+        """
+        if not session_id:
+            return None
+        return await self._redis_client.get(str(session_id))
+
     async def is_valid_session(self, session_id: int | str, cookie_refresh_token: str) -> bool:
         """
         Проверяет валидность сессии
@@ -18,9 +18,21 @@ class BannerApplicationService:
         self._file_repo = file_repo
 
     @filters(roles=[UserRole.ADMIN, UserRole.HIGH_USER, UserRole.USER])
-    async def get_banners(self) -> list[schemas.Banner]:
-        banners = await self._banner_repo.get_all()
-        return [schemas.Banner.from_orm(banner) for banner in banners]
+    async def get_banners(
+            self,
+            after: Optional[str] = None,
+            limit: Optional[int] = None
+    ) -> tuple[list[schemas.Banner], Optional[str]]:
+        try:
+            banners, next_cursor = await self._banner_repo.get_page(
+                limit,
+                order_by="create_at",
+                descending=True,
+                after=after
+            )
+        except ValueError as error:
+            raise BadRequest(str(error))
+        return [schemas.Banner.from_orm(banner) for banner in banners], next_cursor
 
     @filters(roles=[UserRole.ADMIN])
     async def add_banner(self, file_id: uuid.UUID):
@@ -1,23 +1,43 @@
 import json
 import logging
+import time
 import uuid
-from typing import Optional
+from datetime import datetime, timezone
+from typing import Awaitable, Callable, Optional
 
 from fastapi.websockets import WebSocket, WebSocketState
+from pydantic import ValidationError
 
 from src import views
 from src.dependencies.repos import get_repos
-from src.exceptions import AccessDenied, NotFound, BadRequest
+from src.exceptions import APIError, AccessDenied, NotFound, BadRequest
 from src.models import tables, schemas
+from src.models.enums import ChatCommandType, ChatEventType
 from src.models.enums.role import UserRole
 from src.models.schemas import MessageInput
+from src.services.auth import JWTManager, SessionManager
 from src.services.auth.utils import filters
+from src.services.chat.hooks import on_messages_saved
+from src.services.chat.membership import ChatMembership
+from src.services.chat.stream import MessageStream
+from src.services.chat.unread import UnreadCounters
 from src.services.chat.utils import ChatManager
+from src.services.chat.versions import ChatVersions
+from src.services.chat.writer import MessageWriter, PendingMessage
 from src.services.repository import ChatRepo, UserRepo, MessageRepo, FileRepo
 from src.services.repository.user_chat import UserChatAssociationRepo
+from src.utils import cursor
 
 
 class ChatApplicationService:
+    RESUME_LIMIT = 500
+    HISTORY_PAGE_SIZE = 50
+    HISTORY_MAX_PAGE_SIZE = 100
+    DIALOGS_PAGE_SIZE = 50
+    DIALOGS_MAX_PAGE_SIZE = 100
+    SEARCH_PAGE_SIZE = 20
+    SEARCH_MAX_PAGE_SIZE = 50
+    SEARCH_MAX_QUERY_LENGTH = 256
 
     def __init__(
             self,
@@ -28,7 +48,14 @@ class ChatApplicationService:
             chat_manager: ChatManager,
             message_repo: MessageRepo,
             file_repo: FileRepo,
-            current_user: Optional[tables.User]
+            current_user: Optional[tables.User],
+            message_writer: Optional[MessageWriter] = None,
+            jwt: Optional[JWTManager] = None,
+            session: Optional[SessionManager] = None,
+            versions: Optional[ChatVersions] = None,
+            unread: Optional[UnreadCounters] = None,
+            membership: Optional[ChatMembership] = None,
+            after_commit: Optional[list[Callable[[], Awaitable[None]]]] = None
     ):
         self._chat_repo = chat_repo
         self._user_chat_repo = user_chat_repo
@@ -37,78 +64,317 @@ class ChatApplicationService:
         self._current_user = current_user
         self._message_repo = message_repo
         self._file_repo = file_repo
+        self._message_writer = message_writer
+        self._jwt = jwt
+        self._session = session
+        self._versions = versions
+        self._unread = unread
+        self._membership = membership
+        self._after_commit = after_commit
+        self._owner: Optional[tables.User] = None
 
     @filters(roles=[UserRole.ADMIN, UserRole.HIGH_USER, UserRole.USER])
     async def get_unread_msg_count(self) -> int:
-        _ = await self._chat_repo.get_chat_with_unread_count(self._current_user.id)
-        unread_count = 0
-        for chat, count in _:
-            unread_count += count
-        return unread_count
+        return sum((await self._get_unread_counts()).values())
 
     @filters(roles=[UserRole.ADMIN, UserRole.HIGH_USER, UserRole.USER])
     async def mark_msg_as_read(self, message_id: uuid.UUID) -> None:
-        message = await self._message_repo.get(id=message_id)
-        if not message:
-            raise NotFound(f"Сообщение с id {message_id!r} не найдено")
-        if message.owner_id == self._current_user.id:
-            raise AccessDenied("Вы не можете пометить своё сообщение как прочитанное")
-        chat_id = await self._user_chat_repo.get_chat_id(
-            user_id_one=self._current_user.id,
-            user_id_two=message.owner_id
-        )
+        """
+        Отметить прочитанным диалог до сообщения message_id включительно
+
+        Оставлено для старых клиентов, см. read_dialog
+        """
+        chat_id = await self._user_chat_repo.mark_read(self._current_user.id, message_id=message_id)
         if not chat_id:
-            raise NotFound("Пользователи должны быть в одном чате")
-        await self._message_repo.update(message_id, is_read=True)
+            raise NotFound(f"Сообщение с id {message_id!r} не найдено")
+        await self._on_read(chat_id)
 
     @filters(roles=[UserRole.ADMIN, UserRole.HIGH_USER, UserRole.USER])
-    async def get_message_history(self, chat_id) -> list[views.MessageOutput]:
-        _ = await self._message_repo.get_all(chat_id=chat_id)
-        messages = list()
-        for message in _:
-            owner = await self._user_repo.get(id=message.owner_id)
-            messages.append(
-                views.MessageOutput(
-                    id=str(message.id),
-                    text=message.text,
-                    avatar_id=str(owner.avatar_id) if owner.avatar_id else None,
-                    owner_id=str(message.owner_id),
-                    first_name=owner.first_name,
-                    last_name=owner.last_name,
-                    patronymic=owner.patronymic,
-                    is_read=message.is_read,
-                    files=[
-                        schemas.MessageFileInclusion(
-                            file_id=str(file.id),
-                            title=file.file_name
-                        )
-                        for file in await self._file_repo.get_all(message_id=message.id)
-                    ],
-
-                    create_at=message.create_at,
-                    update_at=message.update_at
+    async def read_dialog(self, chat_id: uuid.UUID, message_id: Optional[uuid.UUID] = None) -> None:
+        """
+        Сдвинуть отметку прочтения диалога одним запросом,
+        сколько бы непрочитанных сообщений в нём ни было
+
+        :param chat_id:
+        :param message_id: прочитано всё до этого сообщения включительно, без него - всё на текущий момент
+        """
+        is_marked = await self._user_chat_repo.mark_read(self._current_user.id, chat_id=chat_id, message_id=message_id)
+        if not is_marked and message_id and self._message_writer:
+            # Сообщение уже разослано, но ещё ждёт записи в БД: время берётся из потока диалога
+            message = await self._chat_manager.get_recent_message(chat_id, message_id)
+            if message:
+                is_marked = await self._user_chat_repo.mark_read(
+                    self._current_user.id,
+                    chat_id=chat_id,
+                    until=message.create_at
                 )
+        if not is_marked:
+            raise NotFound("Диалог или сообщение не найдены")
+        await self._on_read(chat_id)
+
+    async def _on_read(self, chat_id: uuid.UUID) -> None:
+        """
+        Обновить штампы версий и счётчик непрочитанных после сдвига отметки прочтения
+
+        Остаток непрочитанных считается по БД уже после commit: посчитанный раньше,
+        он затёр бы увеличения от сообщений, записанных между подсчётом и записью в redis.
+        """
+        if self._versions:
+            await self._on_commit(lambda: self._versions.bump_chats(self._user_chat_repo, [chat_id]))
+        if self._unread:
+            await self._on_commit(lambda: self._recount_unread(chat_id))
+
+    async def _recount_unread(self, chat_id: uuid.UUID) -> None:
+        counts = await self._chat_repo.get_chat_with_unread_count(self._current_user.id, chat_ids=[chat_id])
+        await self._unread.set(self._current_user.id, chat_id, sum(count for _, count in counts))
+
+    async def _on_commit(self, callback: Callable[[], Awaitable[None]]) -> None:
+        """
+        Выполнить побочный эффект вне БД после commit запроса (см. UnitOfWorkRoute),
+        а без единицы работы (websocket) - сразу
+
+        """
+        if self._after_commit is None:
+            await callback()
+        else:
+            self._after_commit.append(callback)
+
+    async def _get_unread_counts(self) -> dict[uuid.UUID, int]:
+        """
+        Непрочитанные текущего пользователя по диалогам: из счётчиков redis,
+        без них - подсчётом по БД
+
+        """
+        if self._unread:
+            return await self._unread.get(self._current_user.id, self._chat_repo)
+        return {
+            chat.id: count
+            for chat, count in await self._chat_repo.get_chat_with_unread_count(self._current_user.id)
+        }
+
+    @filters(roles=[UserRole.ADMIN, UserRole.HIGH_USER, UserRole.USER])
+    async def get_history_etag(self, chat_id: uuid.UUID, *variant: str) -> Optional[str]:
+        """
+        ETag истории диалога по штампу версии из redis, без обращения к БД
+
+        :param chat_id:
+        :param variant: всё, от чего ещё зависит ответ (параметры запроса)
+        """
+        if not self._versions:
+            return None
+        # 304 не должен подтверждать чужому пользователю существование истории
+        await self._check_access(chat_id)
+        return self._versions.etag(await self._versions.chat(chat_id), str(chat_id), *variant)
+
+    @filters(roles=[UserRole.ADMIN, UserRole.HIGH_USER, UserRole.USER])
+    async def get_dialogs_etag(self, *variant: str) -> Optional[str]:
+        """
+        ETag списка диалогов текущего пользователя
+
+        """
+        if not self._versions:
+            return None
+        user_id = str(self._current_user.id)
+        return self._versions.etag(await self._versions.user(user_id), user_id, *variant)
+
+    @filters(roles=[UserRole.ADMIN, UserRole.HIGH_USER, UserRole.USER])
+    async def get_message_history(
+            self,
+            chat_id: uuid.UUID,
+            before: Optional[str] = None,
+            after: Optional[str] = None,
+            limit: Optional[int] = None
+    ) -> tuple[list[views.MessageOutput], Optional[str]]:
+        """
+        Страница истории диалога, сообщения от старых к новым
+
+        Без курсора возвращается последняя страница. next_cursor продолжает историю
+        в том же направлении: передаётся как before (или как after, если страница
+        запрошена через after) и равен None, когда сообщений больше нет.
+        """
+        page, files, read_marks, next_cursor = await self._get_history_page(chat_id, before, after, limit)
+        messages = [
+            self._message_output(
+                message,
+                owner,
+                files.get(message.id, []),
+                is_read=self._is_read(message, read_marks)
             )
-        return messages
+            for message, owner in page
+        ]
+        return messages, next_cursor
 
     @filters(roles=[UserRole.ADMIN, UserRole.HIGH_USER, UserRole.USER])
-    async def get_my_dialogs(self) -> list[views.DialogItem]:
-        _ = await self._user_chat_repo.get_chats(self._current_user.id)
-        dialogs = list()
-        for companion, uca, chat in _:
-            dialogs.append(
-                views.DialogItem(
-                    id=chat.id,
-                    title=f"{companion.first_name} {companion.last_name} {companion.patronymic}",
-                    job_title=companion.job_title,
-                    department=companion.department,
-                    avatar_id=str(companion.avatar_id) if companion.avatar_id else None,
-                    companion_id=str(companion.id),
-                    unread_count=await self._message_repo.count(chat_id=chat.id, owner_id=companion.id, is_read=False),
-                    role=companion.role
-                )
+    async def get_compact_message_history(
+            self,
+            chat_id: uuid.UUID,
+            before: Optional[str] = None,
+            after: Optional[str] = None,
+            limit: Optional[int] = None
+    ) -> tuple[list[views.CompactMessageOutput], dict[str, views.Participant], Optional[str]]:
+        """
+        То же, что get_message_history, но профили авторов передаются
+        один раз на страницу в participants
+
+        """
+        page, files, read_marks, next_cursor = await self._get_history_page(chat_id, before, after, limit)
+        participants = dict()
+        messages = list()
+        for message, owner in page:
+            if str(owner.id) not in participants:
+                participants[str(owner.id)] = self._participant(owner)
+            messages.append(views.CompactMessageOutput(
+                id=str(message.id),
+                text=message.text,
+                owner_id=str(owner.id),
+                is_read=self._is_read(message, read_marks),
+                files=self._file_inclusions(files.get(message.id, [])),
+                create_at=message.create_at,
+                update_at=message.update_at
+            ))
+        return messages, participants, next_cursor
+
+    async def _get_history_page(
+            self,
+            chat_id: uuid.UUID,
+            before: Optional[str],
+            after: Optional[str],
+            limit: Optional[int]
+    ) -> tuple[
+        list[tuple[tables.Message, tables.User]],
+        dict[uuid.UUID, list[tables.File]],
+        dict[uuid.UUID, Optional[datetime]],
+        Optional[str]
+    ]:
+        if before and after:
+            raise BadRequest("Укажите либо before, либо after")
+        await self._check_access(chat_id)
+        limit = limit if limit else self.HISTORY_PAGE_SIZE
+        if limit < 1:
+            raise BadRequest("Размер страницы должен быть положительным")
+        limit = min(limit, self.HISTORY_MAX_PAGE_SIZE)
+        try:
+            position = cursor.decode_cursor(before or after) if before or after else None
+        except ValueError as error:
+            raise BadRequest(str(error))
+
+        # Три запроса на страницу: сообщения с авторами, вложения всех сообщений и отметки прочтения
+        page = await self._message_repo.get_history(
+            chat_id,
+            limit + 1,
+            before=position if before else None,
+            after=position if after else None
+        )
+        next_cursor = None
+        if len(page) > limit:
+            page = page[:limit]
+            last_message, _ = page[-1]
+            next_cursor = cursor.encode_cursor(last_message.create_at, last_message.id)
+        if not after:
+            page = page[::-1]
+
+        files = dict()
+        read_marks = dict()
+        if page:
+            files = self._group_by_message(
+                await self._file_repo.get_by_message_ids([message.id for message, _ in page])
+            )
+            read_marks = {
+                member.user_id: member.last_read_at
+                for member in await self._user_chat_repo.get_all(chat_id=chat_id)
+            }
+        return page, files, read_marks, next_cursor
+
+    @filters(roles=[UserRole.ADMIN, UserRole.HIGH_USER, UserRole.USER])
+    async def search_messages(
+            self,
+            text: str,
+            chat_id: Optional[uuid.UUID] = None,
+            before: Optional[str] = None,
+            limit: Optional[int] = None
+    ) -> tuple[list[views.MessageSearchHit], Optional[str]]:
+        """
+        Поиск по сообщениям диалогов пользователя (или одного диалога), от лучших совпадений
+
+        next_cursor передаётся как before для следующей страницы и равен None,
+        когда результатов больше нет.
+        """
+        text = text.strip()
+        if not text:
+            raise BadRequest("Пустой поисковый запрос")
+        if len(text) > self.SEARCH_MAX_QUERY_LENGTH:
+            raise BadRequest(f"Поисковый запрос длиннее {self.SEARCH_MAX_QUERY_LENGTH} символов")
+        limit = limit if limit else self.SEARCH_PAGE_SIZE
+        if limit < 1:
+            raise BadRequest("Размер страницы должен быть положительным")
+        limit = min(limit, self.SEARCH_MAX_PAGE_SIZE)
+        try:
+            position = cursor.decode_rank_cursor(before) if before else None
+        except ValueError as error:
+            raise BadRequest(str(error))
+        if chat_id:
+            await self._check_access(chat_id)
+
+        page = await self._message_repo.search(
+            self._current_user.id,
+            text,
+            limit + 1,
+            chat_id=chat_id,
+            before=position
+        )
+        next_cursor = None
+        if len(page) > limit:
+            page = page[:limit]
+            last_message, last_rank, _ = page[-1]
+            next_cursor = cursor.encode_rank_cursor(last_rank, last_message.create_at, last_message.id)
+
+        hits = [
+            views.MessageSearchHit(
+                id=str(message.id),
+                chat_id=str(message.chat_id),
+                owner_id=str(message.owner_id),
+                snippet=snippet,
+                rank=rank,
+                create_at=message.create_at
             )
-        return dialogs
+            for message, rank, snippet in page
+        ]
+        return hits, next_cursor
+
+    @filters(roles=[UserRole.ADMIN, UserRole.HIGH_USER, UserRole.USER])
+    async def get_my_dialogs(
+            self,
+            before: Optional[str] = None,
+            limit: Optional[int] = None
+    ) -> tuple[list[views.DialogItem], Optional[str]]:
+        """
+        Страница диалогов от недавних к старым, с превью последнего сообщения
+
+        next_cursor передаётся как before для следующей страницы и равен None,
+        когда диалогов больше нет.
+        """
+        limit = limit if limit else self.DIALOGS_PAGE_SIZE
+        if limit < 1:
+            raise BadRequest("Размер страницы должен быть положительным")
+        limit = min(limit, self.DIALOGS_MAX_PAGE_SIZE)
+        try:
+            position = cursor.decode_cursor(before) if before else None
+        except ValueError as error:
+            raise BadRequest(str(error))
+
+        page = await self._user_chat_repo.get_dialogs(self._current_user.id, limit + 1, before=position)
+        next_cursor = None
+        if len(page) > limit:
+            page = page[:limit]
+            _, last_chat, last_activity_at = page[-1]
+            next_cursor = cursor.encode_cursor(last_activity_at, last_chat.id)
+
+        unread_counts = await self._get_unread_counts()
+        dialogs = [
+            self._dialog_item(chat.id, companion, unread_count=unread_counts.get(chat.id, 0), chat=chat)
+            for companion, chat, _ in page
+        ]
+        return dialogs, next_cursor
 
     @filters(roles=[UserRole.ADMIN, UserRole.HIGH_USER, UserRole.USER])
     async def get_dialog_by_user(self, user_id: uuid.UUID) -> views.DialogItem:
@@ -119,19 +385,44 @@ class ChatApplicationService:
         if not companion:
             raise NotFound(f"Пользователь {user_id!r} не найден")
 
-        chat_id = await self._user_chat_repo.get_chat_id(
-            user_id_one=self._current_user.id,
-            user_id_two=companion.id
+        chat_id, is_created = await self._chat_repo.get_or_create_dialog(self._current_user.id, companion.id)
+        if is_created:
+            me = await self._user_repo.get(id=self._current_user.id)
+            # Диалог виден другим только после commit: до него ни участников в redis,
+            # ни штампов, ни событий о диалоге, которого ещё нет (или уже не будет)
+            await self._on_commit(lambda: self._on_dialog_created(chat_id, me, companion))
+
+        return self._dialog_item(
+            chat_id,
+            companion,
+            unread_count=(await self._get_unread_counts()).get(chat_id, 0),
+            chat=await self._chat_repo.get(id=chat_id)
         )
 
-        if not chat_id:
-            chat_id = await self._chat_repo.create()
-            for _id in [companion.id, self._current_user.id]:
-                await self._user_chat_repo.create(
-                    user_id=_id,
-                    chat_id=chat_id
+    async def _on_dialog_created(self, chat_id: uuid.UUID, me: tables.User, companion: tables.User) -> None:
+        if self._membership:
+            await self._membership.add(chat_id, [companion.id, me.id])
+        if self._versions:
+            await self._versions.bump(user_ids=[companion.id, me.id])
+
+        # Оповещаем открытые подключения обоих пользователей о новом диалоге
+        for user, other in [(companion, me), (me, companion)]:
+            await self._chat_manager.send_event(
+                self._chat_manager.user_channel(user.id),
+                views.ChatEvent(
+                    event=ChatEventType.DIALOG_CREATED,
+                    chat_id=str(chat_id),
+                    data=self._dialog_item(chat_id, other, unread_count=0)
                 )
+            )
 
+    @staticmethod
+    def _dialog_item(
+            chat_id: uuid.UUID,
+            companion: tables.User,
+            unread_count: int,
+            chat: Optional[tables.Chat] = None
+    ) -> views.DialogItem:
         return views.DialogItem(
             id=chat_id,
             title=f"{companion.first_name} {companion.last_name} {companion.patronymic}",
@@ -139,85 +430,357 @@ class ChatApplicationService:
             department=companion.department,
             avatar_id=str(companion.avatar_id) if companion.avatar_id else None,
             companion_id=str(companion.id),
-            unread_count=await self._message_repo.count(chat_id=chat_id, owner_id=companion.id, is_read=False),
-            role=companion.role
+            unread_count=unread_count,
+            role=companion.role,
+            last_message_id=str(chat.last_message_id) if chat and chat.last_message_id else None,
+            last_message_at=chat.last_message_at if chat else None,
+            last_message_preview=chat.last_message_preview if chat else None
         )
 
     @filters(roles=[UserRole.ADMIN, UserRole.HIGH_USER, UserRole.USER])
-    async def subscribe_to_chat(self, websocket: WebSocket, chat_id: uuid.UUID) -> None:
-        # if user in room into database access check
-        chat_companions = await self._user_chat_repo.get_all(chat_id=chat_id)
-        is_found = False
-        for companion in chat_companions:
-            if str(self._current_user.id) == str(companion.user_id):
-                is_found = True
-
-        if not is_found:
-            raise AccessDenied("Для начала создайте диалог")
+    async def subscribe_to_chat(
+            self,
+            websocket: WebSocket,
+            chat_id: uuid.UUID,
+            heartbeat: bool = False,
+            last_message_id: Optional[uuid.UUID] = None,
+            offset: Optional[str] = None,
+            compact: bool = False
+    ) -> None:
+        """
+        Подключение к одному диалогу
+
+        При переподключении клиент передаёт last_message_id (или offset) последнего
+        полученного сообщения, и перед живыми сообщениями ему досылается только пропуск.
+        С compact сообщения приходят без профиля автора, а профиль - один раз,
+        в participants первого сообщения этого автора.
+        """
+        await self._check_access(chat_id)
+        await self._user_repo.session.close()
+
+        await self._chat_manager.connect(websocket, heartbeat=heartbeat, compact=compact)
+        try:
+            await self._chat_manager.resume(
+                websocket,
+                chat_id,
+                last_message_id=last_message_id,
+                offset=offset,
+                fallback=lambda: self._get_missed_messages(websocket, chat_id, last_message_id, offset)
+            )
+            while websocket.client_state == WebSocketState.CONNECTED:
+                response = await self._chat_manager.receive_text(websocket)
+
+                if not response:
+                    continue
+                try:
+                    payload = json.loads(response)
+                    if payload.get("type") == ChatCommandType.PONG:
+                        continue
+                    if payload.get("type") == ChatCommandType.REFRESH:
+                        await self._refresh_connection(websocket)
+                        continue
+                    input_data = schemas.MessageInput(**payload)
+                except (ValueError, AttributeError):
+                    raise BadRequest("Словарь должен соответствовать принимаемой модели")
+
+                output_data = await self._save_message(websocket, chat_id, input_data)
+                await self._chat_manager.send_data(chat_id, output_data)
+        finally:
+            await self._chat_manager.disconnect(websocket)
 
+    @filters(roles=[UserRole.ADMIN, UserRole.HIGH_USER, UserRole.USER])
+    async def subscribe_to_chats(self, websocket: WebSocket, compact: bool = False) -> None:
+        """
+        Одно подключение на все диалоги пользователя
+
+        Подписка на диалоги и отправка сообщений выполняются кадрами ChatCommand,
+        события приходят в виде ChatEvent. События о новых диалогах пользователя
+        приходят в это же подключение, а сам диалог подписывается автоматически.
+        С compact профиль автора приходит один раз, в participants события.
+        """
         await self._user_repo.session.close()
 
-        if not self._chat_manager.is_exists(chat_id):
-            await self._chat_manager.create_room(room_id=chat_id)
-        await self._chat_manager.connect(websocket, room_id=chat_id)
+        await self._chat_manager.connect(websocket, multiplexed=True, heartbeat=True, compact=compact)
+        try:
+            await self._chat_manager.join(websocket, self._chat_manager.user_channel(self._current_user.id))
+            while websocket.client_state == WebSocketState.CONNECTED:
+                response = await self._chat_manager.receive_text(websocket)
+
+                if not response:
+                    continue
+                try:
+                    command = schemas.ChatCommand(**json.loads(response))
+                except ValidationError as error:
+                    details = "; ".join(str(item["msg"]) for item in error.errors())
+                    self._notify_error(websocket, f"Словарь должен соответствовать принимаемой модели: {details}")
+                    continue
+                except ValueError:
+                    self._notify_error(websocket, "Словарь должен соответствовать принимаемой модели")
+                    continue
+
+                try:
+                    await self._handle_command(websocket, command)
+                except APIError as error:
+                    self._notify_error(websocket, error.message, chat_id=command.chat_id)
+        finally:
+            await self._chat_manager.disconnect(websocket)
+
+    async def _handle_command(self, websocket: WebSocket, command: schemas.ChatCommand) -> None:
+        if command.type == ChatCommandType.SUBSCRIBE:
+            if self._membership:
+                chat_ids = await self._membership.filter_chats(self._current_user.id, command.chat_ids)
+            else:
+                async with websocket.app.state.db_session() as session:
+                    chat_ids = await UserChatAssociationRepo(session).get_user_chat_ids(
+                        user_id=self._current_user.id,
+                        chat_ids=command.chat_ids
+                    )
+            for chat_id in chat_ids:
+                await self._chat_manager.join(websocket, self._chat_manager.chat_channel(chat_id))
+            self._chat_manager.notify(websocket, views.ChatEvent(
+                event=ChatEventType.SUBSCRIBED,
+                data=[str(chat_id) for chat_id in chat_ids]
+            ))
+            if len(chat_ids) != len(set(command.chat_ids)):
+                raise AccessDenied("Для части диалогов у вас нет доступа")
+
+        elif command.type == ChatCommandType.UNSUBSCRIBE:
+            for chat_id in command.chat_ids:
+                await self._chat_manager.leave(websocket, self._chat_manager.chat_channel(chat_id))
+            self._chat_manager.notify(websocket, views.ChatEvent(
+                event=ChatEventType.UNSUBSCRIBED,
+                data=[str(chat_id) for chat_id in command.chat_ids]
+            ))
 
-        ws = self._chat_manager.get_room_ws(room_id=chat_id)
-        while websocket.client_state == WebSocketState.CONNECTED:
-            response = await ws.receive_text(websocket)
+        elif command.type == ChatCommandType.MESSAGE:
+            if not command.chat_id:
+                raise BadRequest("Не указан диалог")
+            if not self._chat_manager.is_joined(websocket, self._chat_manager.chat_channel(command.chat_id)):
+                raise AccessDenied("Для начала подпишитесь на диалог")
 
-            if not response:
-                continue
             try:
-                input_data = schemas.MessageInput(**json.loads(response))
+                input_data = schemas.MessageInput(text=command.text, files=command.files)
             except ValueError:
-                raise BadRequest("Словарь должен соответствовать принимаемой модели")
+                raise BadRequest("Сообщение должно соответствовать принимаемой модели")
+            output_data = await self._save_message(websocket, command.chat_id, input_data)
+            await self._chat_manager.send_data(command.chat_id, output_data)
 
-            # save into database logic
-            scope = websocket.app.state
-            async with scope.db_session() as session:
-                message_repo = MessageRepo(session)
-                message_id = await message_repo.create(
+        elif command.type == ChatCommandType.REFRESH:
+            await self._refresh_connection(websocket)
+
+        elif command.type == ChatCommandType.PONG:
+            pass
+
+    async def _refresh_connection(self, websocket: WebSocket) -> None:
+        """
+        Продление авторизации открытого подключения
+
+        Токены из кук рукопожатия к этому моменту могли быть обновлены http-запросами,
+        поэтому проверяется актуальный refresh-токен сессии из redis: подключение
+        продлевается на время жизни access-токена, пока сессия жива.
+        """
+        session_id = self._session.get_session_id(websocket)
+        refresh_token = await self._session.get_refresh_token(session_id)
+        if not refresh_token or not self._jwt.is_valid_refresh_token(refresh_token):
+            raise AccessDenied("Invalid session")
+        if self._jwt.decode_refresh_token(refresh_token).id != str(self._current_user.id):
+            raise AccessDenied("Invalid session")
+
+        async with websocket.app.state.db_session() as session:
+            user = await UserRepo(session).get(id=self._current_user.id)
+        if not user or user.role == UserRole.BANNED:
+            raise AccessDenied("Пользователь заблокирован")
+
+        exp = int(time.time() + self._jwt.ACCESS_TOKEN_EXPIRE_MINUTES * 60)
+        self._chat_manager.extend(websocket, exp)
+        self._chat_manager.notify(websocket, views.ChatEvent(event=ChatEventType.REFRESHED, data=exp))
+
+    def _notify_error(self, websocket: WebSocket, message: str, chat_id: uuid.UUID = None) -> None:
+        self._chat_manager.notify(websocket, views.ChatEvent(
+            event=ChatEventType.ERROR,
+            chat_id=str(chat_id) if chat_id else None,
+            data=message
+        ))
+
+    async def _save_message(
+            self,
+            websocket: WebSocket,
+            chat_id: uuid.UUID,
+            input_data: schemas.MessageInput
+    ) -> views.MessageOutput:
+        if len(input_data.files) > 10:
+            raise BadRequest("Максимальное кол-во файлов - 10")
+
+        # Вложения захватываются сразу, в одной транзакции с сообщением: иначе два
+        # одновременных сообщения разослали бы один и тот же файл
+        if self._message_writer and not input_data.files:
+            return await self._ingest_message(websocket, chat_id, input_data)
+
+        # save into database logic
+        scope = websocket.app.state
+        async with scope.db_session() as session:
+            # Сообщение, вложения и сводка диалога - одна транзакция на сообщение ws
+            async with session.begin():
+                message_obj = await MessageRepo(session).create_returning(
                     text=input_data.text,
                     chat_id=chat_id,
                     owner_id=self._current_user.id
                 )
-                message_obj = await message_repo.get(id=message_id)
-                file_repo = FileRepo(session)
+                await ChatRepo(session).set_last_messages(
+                    [(chat_id, message_obj.id, message_obj.create_at, input_data.text)]
+                )
+                files = list()
+                if input_data.files:
+                    files = await FileRepo(session).attach_to_message(message_obj.id, input_data.files)
+            owner = await self._get_owner(session)
+            await on_messages_saved(
+                UserChatAssociationRepo(session),
+                [(chat_id, self._current_user.id, message_obj.create_at)],
+                versions=self._versions,
+                unread=self._unread
+            )
 
-                if len(input_data.files) > 10:
-                    raise BadRequest("Максимальное кол-во файлов - 10")
+        return self._message_output(message_obj, owner, files)
 
-                files = list()
-                for file_id in input_data.files:
-                    file = await file_repo.get(id=file_id)
-                    if not file:
-                        continue  # todo raise
-
-                    if file.message_id:
-                        continue  # todo raise
-
-                    await file_repo.update(file.id, message_id=message_id)
-                    files.append(
-                        schemas.MessageFileInclusion(
-                            title=file.file_name,
-                            file_id=str(file.id)
-                        )
-                    )
-                owner = await self._user_repo.get(id=self._current_user.id)
+    async def _ingest_message(
+            self,
+            websocket: WebSocket,
+            chat_id: uuid.UUID,
+            input_data: schemas.MessageInput
+    ) -> views.MessageOutput:
+        """
+        Сообщение без вложений получает id и время создания в приложении и сразу
+        рассылается, а в БД записывается пачкой в фоне (см. MessageWriter)
 
-            output_data = views.MessageOutput(
-                id=str(message_id),
-                text=input_data.text,
-                avatar_id=str(owner.avatar_id) if owner.avatar_id else None,
-                owner_id=str(owner.id),
-                first_name=owner.first_name,
-                last_name=owner.last_name,
-                patronymic=owner.patronymic,
-                files=files,
-                is_read=message_obj.is_read,
-                create_at=message_obj.create_at,
-                update_at=message_obj.update_at
+        """
+        async with websocket.app.state.db_session() as session:
+            owner = await self._get_owner(session)
+
+        message = PendingMessage(
+            id=uuid.uuid4(),
+            chat_id=chat_id,
+            owner_id=self._current_user.id,
+            text=input_data.text,
+            create_at=datetime.now(timezone.utc)
+        )
+        await self._message_writer.put(message)
+        return self._message_output(message, owner, [])
+
+    async def _get_missed_messages(
+            self,
+            websocket: WebSocket,
+            chat_id: uuid.UUID,
+            last_message_id: Optional[uuid.UUID],
+            offset: Optional[str]
+    ) -> list[views.MessageOutput]:
+        """
+        Пропущенные сообщения из БД, когда точка продолжения уже вытеснена из потока
+
+        """
+        async with websocket.app.state.db_session() as session:
+            since = MessageStream.offset_time(offset) if offset else None
+            if last_message_id:
+                anchor = await MessageRepo(session).get(id=last_message_id, chat_id=chat_id)
+                since = anchor.create_at if anchor else None
+            if not since:
+                return list()
+
+            messages = await MessageRepo(session).get_after(
+                chat_id,
+                since,
+                limit=self.RESUME_LIMIT,
+                exclude_id=last_message_id
+            )
+            if not messages:
+                return list()
+
+            owners = dict()
+            for owner_id in {message.owner_id for message in messages}:
+                owners[owner_id] = await UserRepo(session).get(id=owner_id)
+            files = self._group_by_message(
+                await FileRepo(session).get_by_message_ids([message.id for message in messages])
+            )
+
+        return [
+            self._message_output(message, owners[message.owner_id], files.get(message.id, []))
+            for message in messages
+        ]
+
+    async def _check_access(self, chat_id: uuid.UUID) -> None:
+        """
+        Проверка участия текущего пользователя в диалоге,
+        с индексом участников - без обращения к БД
+
+        """
+        if self._membership:
+            is_member = await self._membership.is_member(self._current_user.id, chat_id)
+        else:
+            is_member = bool(await self._user_chat_repo.get_user_chat_ids(self._current_user.id, [chat_id]))
+        if not is_member:
+            raise AccessDenied("Для начала создайте диалог")
+
+    async def _get_owner(self, session) -> tables.User:
+        # Профиль отправителя не меняется за время жизни подключения
+        if not self._owner:
+            self._owner = await UserRepo(session).get(id=self._current_user.id)
+        return self._owner
+
+    @staticmethod
+    def _group_by_message(files: list[tables.File]) -> dict[uuid.UUID, list[tables.File]]:
+        grouped = dict()
+        for file in files:
+            grouped.setdefault(file.message_id, []).append(file)
+        return grouped
+
+    @staticmethod
+    def _is_read(message: tables.Message, read_marks: dict[uuid.UUID, Optional[datetime]]) -> bool:
+        """
+        Сообщение прочитано, если отметка прочтения кого-то, кроме автора, не раньше сообщения
+
+        """
+        return message.is_read or any(
+            user_id != message.owner_id and read_at is not None and read_at >= message.create_at
+            for user_id, read_at in read_marks.items()
+        )
+
+    @classmethod
+    def _message_output(
+            cls,
+            message: tables.Message | PendingMessage,
+            owner: tables.User,
+            files: list[tables.File],
+            is_read: Optional[bool] = None
+    ) -> views.MessageOutput:
+        return views.MessageOutput(
+            id=str(message.id),
+            text=message.text,
+            avatar_id=str(owner.avatar_id) if owner.avatar_id else None,
+            owner_id=str(owner.id),
+            first_name=owner.first_name,
+            last_name=owner.last_name,
+            patronymic=owner.patronymic,
+            files=cls._file_inclusions(files),
+            is_read=message.is_read if is_read is None else is_read,
+            create_at=message.create_at,
+            update_at=message.update_at
+        )
+
+    @staticmethod
+    def _file_inclusions(files: list[tables.File]) -> list[schemas.MessageFileInclusion]:
+        return [
+            schemas.MessageFileInclusion(
+                title=file.file_name,
+                file_id=str(file.id)
             )
-            await self._chat_manager.send_data(chat_id, output_data.json())
+            for file in files
+        ]
 
-        await self._chat_manager.disconnect(websocket, room_id=chat_id)
+    @staticmethod
+    def _participant(user: tables.User) -> views.Participant:
+        return views.Participant(
+            id=str(user.id),
+            avatar_id=str(user.avatar_id) if user.avatar_id else None,
+            first_name=user.first_name,
+            last_name=user.last_name,
+            patronymic=user.patronymic
+        )
@@ -0,0 +1,150 @@
+import asyncio
+import logging
+from abc import ABC, abstractmethod
+from typing import Awaitable, Callable, Optional
+
+from src.utils import RedisClient
+
+MessageHandler = Callable[[str, str], Awaitable[None]]
+
+
+class AbstractBroker(ABC):
+    """
+    Брокер сообщений между воркерами
+
+    Каждый воркер подписывается на каналы комнат, в которых
+    у него есть локальные подключения, и получает всё, что
+    публикуется в эти каналы любым воркером (в том числе им самим).
+    """
+
+    @abstractmethod
+    async def start(self, handler: MessageHandler) -> None:
+        """
+        Запустить брокер
+        :param handler: корутина (channel, data), вызываемая на каждое сообщение
+        """
+        pass
+
+    @abstractmethod
+    async def stop(self) -> None:
+        """
+        Остановить брокер и освободить подписки
+        """
+        pass
+
+    @abstractmethod
+    async def subscribe(self, channel: str) -> None:
+        pass
+
+    @abstractmethod
+    async def unsubscribe(self, channel: str) -> None:
+        pass
+
+    @abstractmethod
+    async def publish(self, channel: str, data: str) -> None:
+        pass
+
+
+class LocalBroker(AbstractBroker):
+    """
+    Брокер в пределах одного процесса
+
+    Подходит для запуска в один воркер (и для локальной разработки)
+    """
+
+    def __init__(self):
+        self._handler: Optional[MessageHandler] = None
+        self._channels: set[str] = set()
+
+    async def start(self, handler: MessageHandler) -> None:
+        self._handler = handler
+
+    async def stop(self) -> None:
+        self._channels.clear()
+        self._handler = None
+
+    async def subscribe(self, channel: str) -> None:
+        self._channels.add(channel)
+
+    async def unsubscribe(self, channel: str) -> None:
+        self._channels.discard(channel)
+
+    async def publish(self, channel: str, data: str) -> None:
+        if self._handler and channel in self._channels:
+            await self._handler(channel, data)
+
+
+class RedisBroker(AbstractBroker):
+    """
+    Брокер поверх Redis pub/sub
+
+    Позволяет запускать чат в нескольких воркерах и на нескольких узлах:
+    сообщение публикуется в канал комнаты, а каждый воркер, у которого
+    есть подключения к этой комнате, пересылает его своим сокетам.
+    """
+
+    READ_TIMEOUT = 1.0
+
+    def __init__(self, redis_client: RedisClient):
+        self._redis_client = redis_client
+        self._pubsub = None
+        self._handler: Optional[MessageHandler] = None
+        self._listener: Optional[asyncio.Task] = None
+        # Будит слушателя при первой подписке, чтобы не опрашивать pubsub по таймеру
+        self._has_subscriptions = asyncio.Event()
+        self.log = logging.getLogger(__name__)
+
+    async def start(self, handler: MessageHandler) -> None:
+        self._handler = handler
+        self._pubsub = self._redis_client.pubsub()
+        self._listener = asyncio.create_task(self._listen())
+
+    async def stop(self) -> None:
+        if self._listener:
+            self._listener.cancel()
+            try:
+                await self._listener
+            except asyncio.CancelledError:
+                pass
+            self._listener = None
+        if self._pubsub:
+            await self._pubsub.close()
+            self._pubsub = None
+
+    async def subscribe(self, channel: str) -> None:
+        await self._pubsub.subscribe(channel)
+        self._has_subscriptions.set()
+
+    async def unsubscribe(self, channel: str) -> None:
+        await self._pubsub.unsubscribe(channel)
+
+    async def publish(self, channel: str, data: str) -> None:
+        await self._redis_client.publish(channel, data)
+
+    async def _listen(self) -> None:
+        while True:
+            # Пока нет ни одной подписки, соединение pubsub не установлено
+            if not self._pubsub.subscribed:
+                self._has_subscriptions.clear()
+                await self._has_subscriptions.wait()
+                continue
+
+            try:
+                message = await self._pubsub.get_message(
+                    ignore_subscribe_messages=True,
+                    timeout=self.READ_TIMEOUT
+                )
+            except asyncio.CancelledError:
+                raise
+            except Exception as ex:
+                self.log.exception("Ошибка чтения из Redis pub/sub", exc_info=ex)
+                await asyncio.sleep(self.READ_TIMEOUT)
+                continue
+
+            if not message or message["type"] != "message":
+                continue
+
+            try:
+                await self._handler(message["channel"], message["data"])
+            except Exception as ex:
+                self.log.exception(f"Ошибка обработки сообщения канала {message['channel']!r}", exc_info=ex)
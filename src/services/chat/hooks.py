@@ -0,0 +1,48 @@
+import uuid
+from collections import Counter, defaultdict
+from datetime import datetime
+from typing import Iterable, Optional
+
+from src.services.chat.unread import UnreadCounters
+from src.services.chat.versions import ChatVersions
+from src.services.repository.user_chat import UserChatAssociationRepo
+
+
+async def on_messages_saved(
+        user_chat_repo: UserChatAssociationRepo,
+        messages: Iterable[tuple[uuid.UUID, uuid.UUID, datetime]],
+        *,
+        versions: Optional[ChatVersions] = None,
+        unread: Optional[UnreadCounters] = None
+) -> None:
+    """
+    Обновить то, что выводится из сообщений, после их записи в БД: штампы версий
+    (ETag) и счётчики непрочитанных участников. Участники всех диалогов читаются
+    одним запросом на пачку.
+
+    Сообщение не увеличивает счётчик участника, если его отметка прочтения уже
+    не раньше сообщения: диалог прочитан, пока пачка ждала записи.
+
+    :param user_chat_repo:
+    :param messages: тройки (chat_id, owner_id, create_at) записанных сообщений
+    :param versions:
+    :param unread:
+    """
+    messages = list(messages)
+    chat_ids = list({chat_id for chat_id, _, _ in messages})
+    if not chat_ids or not (versions or unread):
+        return
+
+    members = defaultdict(list)
+    for chat_id, user_id, last_read_at in await user_chat_repo.get_members(chat_ids):
+        members[chat_id].append((user_id, last_read_at))
+
+    if versions:
+        await versions.bump(chat_ids, {user_id for users in members.values() for user_id, _ in users})
+    if unread:
+        counts = Counter()
+        for chat_id, owner_id, create_at in messages:
+            for user_id, last_read_at in members[chat_id]:
+                if user_id != owner_id and (last_read_at is None or last_read_at < create_at):
+                    counts[(user_id, chat_id)] += 1
+        await unread.add(counts)
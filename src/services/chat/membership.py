@@ -0,0 +1,117 @@
+import logging
+import time
+import uuid
+from collections import OrderedDict, defaultdict
+from typing import Iterable
+
+from sqlalchemy.orm import sessionmaker
+
+from src.services.repository.user_chat import UserChatAssociationRepo
+from src.utils import RedisClient
+
+
+class ChatMembership:
+    """
+    Индекс участников диалогов для проверки доступа
+
+    Участники диалога хранятся в множестве redis "members:chat:<id>", а недавно
+    проверенные диалоги - ещё и в памяти воркера на CACHE_TTL секунд. Postgres
+    читается только при отсутствии множества (старый диалог или истёкший ключ).
+    Состав личного диалога после создания не меняется, поэтому кэш не инвалидируется.
+    """
+
+    KEY_PREFIX = "members:chat:"
+    EXPIRE = 604800  # сек
+    CACHE_TTL = 60  # сек
+    CACHE_SIZE = 100000
+
+    def __init__(self, redis_client: RedisClient, db_session: sessionmaker, cache_ttl: float = None):
+        self._redis_client = redis_client
+        self._db_session = db_session
+        self._cache_ttl = cache_ttl if cache_ttl else self.CACHE_TTL
+        self._cache: OrderedDict[str, tuple[float, frozenset[str]]] = OrderedDict()
+        self.log = logging.getLogger(__name__)
+
+    @classmethod
+    def key(cls, chat_id: uuid.UUID | str) -> str:
+        return f"{cls.KEY_PREFIX}{chat_id}"
+
+    async def is_member(self, user_id: uuid.UUID | str, chat_id: uuid.UUID | str) -> bool:
+        return str(user_id) in (await self.get([chat_id])).get(str(chat_id), ())
+
+    async def filter_chats(self, user_id: uuid.UUID | str, chat_ids: Iterable[uuid.UUID]) -> list[uuid.UUID]:
+        """
+        Возвращает те из chat_ids, в которых состоит пользователь
+
+        """
+        chat_ids = list(dict.fromkeys(chat_ids))
+        members = await self.get(chat_ids)
+        return [chat_id for chat_id in chat_ids if str(user_id) in members.get(str(chat_id), ())]
+
+    async def get(self, chat_ids: Iterable[uuid.UUID | str]) -> dict[str, frozenset[str]]:
+        """
+        Участники диалогов: из памяти, затем из redis, затем из БД
+
+        :return: {chat_id: id участников}, несуществующие диалоги отсутствуют
+        """
+        now = time.monotonic()
+        result = dict()
+        missing = list()
+        for chat_id in map(str, chat_ids):
+            cached = self._cache.get(chat_id)
+            if cached and cached[0] > now:
+                result[chat_id] = cached[1]
+            else:
+                missing.append(chat_id)
+        if not missing:
+            return result
+
+        try:
+            for chat_id, members in zip(missing, await self._redis_client.smembers([self.key(c) for c in missing])):
+                if members:
+                    result[chat_id] = self._remember(chat_id, members, now)
+        except Exception as ex:
+            self.log.exception("Участники диалогов недоступны в redis, чтение из БД", exc_info=ex)
+
+        missing = [chat_id for chat_id in missing if chat_id not in result]
+        if missing:
+            loaded = await self._load(missing)
+            for chat_id, members in loaded.items():
+                result[chat_id] = self._remember(chat_id, members, now)
+            await self._store(loaded)
+        return result
+
+    async def add(self, chat_id: uuid.UUID | str, user_ids: Iterable[uuid.UUID | str]) -> None:
+        """
+        Записать участников нового диалога
+
+        """
+        members = {str(user_id) for user_id in user_ids}
+        self._remember(str(chat_id), members, time.monotonic())
+        await self._store({str(chat_id): members})
+
+    def _remember(self, chat_id: str, members: Iterable[str], now: float) -> frozenset[str]:
+        members = frozenset(members)
+        self._cache[chat_id] = (now + self._cache_ttl, members)
+        self._cache.move_to_end(chat_id)
+        while len(self._cache) > self.CACHE_SIZE:
+            self._cache.popitem(last=False)
+        return members
+
+    async def _load(self, chat_ids: list[str]) -> dict[str, set[str]]:
+        members = defaultdict(set)
+        async with self._db_session() as session:
+            for chat_id, user_id, _ in await UserChatAssociationRepo(session).get_members(chat_ids):
+                members[str(chat_id)].add(str(user_id))
+        return members
+
+    async def _store(self, members: dict[str, set[str]]) -> None:
+        if not members:
+            return
+        try:
+            await self._redis_client.sadd(
+                {self.key(chat_id): list(user_ids) for chat_id, user_ids in members.items()},
+                expire=self.EXPIRE
+            )
+        except Exception as ex:
+            self.log.exception("Не удалось записать участников диалогов в redis", exc_info=ex)
@@ -0,0 +1,133 @@
+import dataclasses
+import logging
+import uuid
+from datetime import datetime, timezone
+from typing import Optional
+
+from src.exceptions import BadRequest
+from src.utils import RedisClient
+
+
+@dataclasses.dataclass
+class StreamEntry:
+    offset: str
+    message_id: str
+    event: str
+
+
+class MessageStream:
+    """
+    Последние сообщения диалогов в ограниченных потоках Redis ("stream:chat:<id>")
+
+    Каждое разосланное сообщение дописывается в поток своего диалога, а идентификатор
+    записи (offset) уходит клиенту вместе с событием. При переподключении клиент
+    передаёт последний полученный offset или id сообщения, и ему досылается только
+    пропущенный хвост, без повторного чтения истории из БД.
+    """
+
+    KEY_PREFIX = "stream:chat:"
+    MAXLEN = 1000
+    TTL = 86400  # сек
+    SCAN_COUNT = 100
+
+    def __init__(self, redis_client: RedisClient, maxlen: int = None, ttl: int = None):
+        self._redis_client = redis_client
+        self._maxlen = maxlen if maxlen else self.MAXLEN
+        self._ttl = ttl if ttl else self.TTL
+        self.log = logging.getLogger(__name__)
+
+    @classmethod
+    def key(cls, chat_id: uuid.UUID | str) -> str:
+        return f"{cls.KEY_PREFIX}{chat_id}"
+
+    @staticmethod
+    def parse_offset(offset: str) -> tuple[int, int]:
+        try:
+            ms, _, seq = offset.partition("-")
+            return int(ms), int(seq or 0)
+        except ValueError:
+            raise BadRequest(f"Некорректный offset {offset!r}")
+
+    @classmethod
+    def offset_time(cls, offset: str) -> datetime:
+        """
+        Время добавления записи, зашитое в её идентификатор
+
+        """
+        ms, _ = cls.parse_offset(offset)
+        return datetime.fromtimestamp(ms / 1000, tz=timezone.utc)
+
+    async def append(self, chat_id: uuid.UUID | str, message_id: str, event: str) -> Optional[str]:
+        """
+        Дописать событие в поток диалога
+
+        :return: offset записи или None, если Redis недоступен
+                 (сообщение всё равно рассылается, но не попадёт в досылку)
+        """
+        try:
+            return await self._redis_client.xadd(
+                self.key(chat_id),
+                {"message_id": message_id, "event": event},
+                maxlen=self._maxlen,
+                expire=self._ttl
+            )
+        except Exception as ex:
+            self.log.exception(f"Не удалось записать сообщение {message_id} в поток", exc_info=ex)
+
+    async def read_after(
+            self,
+            chat_id: uuid.UUID | str,
+            message_id: str = None,
+            offset: str = None
+    ) -> tuple[list[StreamEntry], bool]:
+        """
+        Записи потока после сообщения message_id (или после offset), от старых к новым
+
+        :return: (записи, полнота) - если точка продолжения уже вытеснена из потока,
+                 возвращается весь поток и False: начало пропуска нужно дочитать из БД
+        """
+        key = self.key(chat_id)
+        if offset:
+            self.parse_offset(offset)
+            first = await self._redis_client.xrange(key, count=1)
+            if not first:
+                return [], False
+            entries = await self._redis_client.xrange(key, min=f"({offset}")
+            return [self._entry(*item) for item in entries], \
+                self.parse_offset(first[0][0]) <= self.parse_offset(offset)
+
+        # id сообщения в идентификатор записи не переводится, поэтому
+        # поток просматривается с конца страницами до нужного сообщения
+        entries = list()
+        max_id = "+"
+        while True:
+            page = await self._redis_client.xrevrange(key, max=max_id, count=self.SCAN_COUNT)
+            for item in page:
+                entry = self._entry(*item)
+                if entry.message_id == message_id:
+                    return entries[::-1], True
+                entries.append(entry)
+            if len(page) < self.SCAN_COUNT:
+                return entries[::-1], False
+            max_id = f"({page[-1][0]}"
+
+    async def find(self, chat_id: uuid.UUID | str, message_id: str) -> Optional[StreamEntry]:
+        """
+        Запись сообщения message_id, если оно ещё в потоке диалога
+
+        """
+        key = self.key(chat_id)
+        max_id = "+"
+        while True:
+            page = await self._redis_client.xrevrange(key, max=max_id, count=self.SCAN_COUNT)
+            for item in page:
+                entry = self._entry(*item)
+                if entry.message_id == message_id:
+                    return entry
+            if len(page) < self.SCAN_COUNT:
+                return None
+            max_id = f"({page[-1][0]}"
+
+    @staticmethod
+    def _entry(offset: str, fields: dict) -> StreamEntry:
+        return StreamEntry(offset=offset, message_id=fields["message_id"], event=fields["event"])
@@ -0,0 +1,99 @@
+import logging
+import uuid
+
+from src.services.repository import ChatRepo
+from src.utils import RedisClient
+
+
+class UnreadCounters:
+    """
+    Счётчики непрочитанных сообщений пользователя по диалогам в хэше redis "unread:<user_id>"
+
+    Счётчик увеличивается при записи сообщения и сбрасывается при прочтении, поэтому
+    список диалогов и общее кол-во непрочитанных отдаются одним HGETALL. Отсутствующий
+    хэш (холодный старт) собирается из Postgres. Хэш живёт EXPIRE секунд с момента
+    сборки и затем пересобирается, что исправляет накопившиеся расхождения.
+    """
+
+    KEY_PREFIX = "unread:"
+    BUILT_FIELD = "~"  # отличает собранный хэш без непрочитанных от отсутствующего
+    EXPIRE = 86400  # сек
+
+    # Поля меняются только в уже собранных хэшах: иначе частичный хэш сошёл бы за полный.
+    # ARGV[1] - операция (incr|set), далее для каждого ключа пара (поле, значение)
+    UPDATE_SCRIPT = """
+    for i, key in ipairs(KEYS) do
+        if redis.call('EXISTS', key) == 1 then
+            local field, value = ARGV[i * 2], ARGV[i * 2 + 1]
+            if ARGV[1] == 'incr' then
+                redis.call('HINCRBY', key, field, value)
+            else
+                redis.call('HSET', key, field, value)
+            end
+        end
+    end
+    return 0
+    """
+
+    def __init__(self, redis_client: RedisClient):
+        self._redis_client = redis_client
+        self.log = logging.getLogger(__name__)
+
+    @classmethod
+    def key(cls, user_id: uuid.UUID | str) -> str:
+        return f"{cls.KEY_PREFIX}{user_id}"
+
+    async def get(self, user_id: uuid.UUID, chat_repo: ChatRepo) -> dict[uuid.UUID, int]:
+        """
+        Непрочитанные по диалогам (только диалоги, где они есть)
+
+        :param user_id:
+        :param chat_repo: для сборки хэша, если его нет
+        """
+        try:
+            data = await self._redis_client.hgetall(self.key(user_id))
+        except Exception as ex:
+            self.log.exception("Счётчики непрочитанных недоступны, подсчёт по БД", exc_info=ex)
+            return await self._count(user_id, chat_repo)
+        if not data:
+            return await self.rebuild(user_id, chat_repo)
+        return {
+            uuid.UUID(chat_id): int(count)
+            for chat_id, count in data.items()
+            if chat_id != self.BUILT_FIELD and int(count) > 0
+        }
+
+    async def rebuild(self, user_id: uuid.UUID, chat_repo: ChatRepo) -> dict[uuid.UUID, int]:
+        """
+        Пересобрать счётчики пользователя из Postgres
+
+        """
+        counts = await self._count(user_id, chat_repo)
+        mapping = {self.BUILT_FIELD: 1, **{str(chat_id): count for chat_id, count in counts.items()}}
+        await self._redis_client.hreplace(self.key(user_id), mapping, expire=self.EXPIRE)
+        return counts
+
+    async def add(self, counts: dict[tuple[uuid.UUID, uuid.UUID], int]) -> None:
+        """
+        Увеличить счётчики
+
+        :param counts: {(user_id, chat_id): на сколько увеличить}
+        """
+        await self._update("incr", counts)
+
+    async def set(self, user_id: uuid.UUID, chat_id: uuid.UUID, count: int = 0) -> None:
+        await self._update("set", {(user_id, chat_id): count})
+
+    async def _update(self, operation: str, values: dict[tuple[uuid.UUID, uuid.UUID], int]) -> None:
+        if not values:
+            return
+        keys = list()
+        args = [operation]
+        for (user_id, chat_id), value in values.items():
+            keys.append(self.key(user_id))
+            args.extend([str(chat_id), value])
+        await self._redis_client.eval(self.UPDATE_SCRIPT, keys, args)
+
+    @staticmethod
+    async def _count(user_id: uuid.UUID, chat_repo: ChatRepo) -> dict[uuid.UUID, int]:
+        return {chat.id: count for chat, count in await chat_repo.get_chat_with_unread_count(user_id)}
@@ -1,48 +1,382 @@
+import json
+import logging
+import sys
 import uuid
-from typing import Optional, AsyncGenerator, Any
+from typing import Awaitable, Callable, Optional
 
 from fastapi.websockets import WebSocket
 
-from src.models import schemas
+from src import views
+from src.exceptions import APIError
+from src.models.enums import ChatEventType
+from src.services.chat.broker import AbstractBroker, LocalBroker
+from src.services.chat.stream import MessageStream
 from src.services.chat.wsmanager import WSJWTConnectionManager
 
 
+class Room:
+    """
+    Локальные подключения одного канала брокера
+
+    """
+    __slots__ = ("channel", "members")
+
+    def __init__(self, channel: str):
+        self.channel = channel
+        self.members: set[WebSocket] = set()
+
+    def __len__(self) -> int:
+        return len(self.members)
+
+    def __iter__(self):
+        # Копия: во время обхода подключения могут отвалиться
+        return iter(tuple(self.members))
+
+
 class ChatManager:
-    def __init__(self):
-        self._rooms: dict = {}
+    """
+    Комнаты чата поверх брокера сообщений
 
-    async def connect(self, websocket: WebSocket, room_id: uuid.UUID) -> None:
-        assert room_id in self._rooms
-        await self._rooms[room_id]['ws'].connect(websocket)
+    Комната - это канал брокера: "chat:<id>" для диалога и "user:<id>"
+    для событий пользователя (например, о новом диалоге). Одно подключение
+    может состоять в нескольких комнатах (мультиплексированный ws).
+    """
+    CHAT_CHANNEL_PREFIX = "chat:"
+    USER_CHANNEL_PREFIX = "user:"
+    # Поля профиля автора, которые компактный формат выносит в participants
+    PARTICIPANT_FIELDS = ("avatar_id", "first_name", "last_name", "patronymic")
 
-    async def disconnect(self, websocket: WebSocket, room_id: uuid.UUID) -> None:
-        ws: WSJWTConnectionManager = self._rooms[room_id]['ws']
-        await ws.disconnect(websocket)
-        if ws.connections == 0:
-            self._rooms.pop(room_id)
+    def __init__(
+            self,
+            broker: AbstractBroker = None,
+            send_queue_size: int = None,
+            ping_interval: float = None,
+            ping_timeout: float = None,
+            stream: MessageStream = None
+    ):
+        self._ws = WSJWTConnectionManager(send_queue_size=send_queue_size)
+        self._ping_interval = ping_interval
+        self._ping_timeout = ping_timeout
+        self._rooms: dict[str, Room] = {}
+        self._subscriptions: dict[WebSocket, set[str]] = {}
+        self._multiplexed: set[WebSocket] = set()
+        self._compact: dict[WebSocket, set[str]] = {}
+        self._resuming: dict[WebSocket, list[str]] = {}
+        self._broker = broker if broker else LocalBroker()
+        self._stream = stream
+        self.log = logging.getLogger(__name__)
 
-    async def create_room(self, room_id) -> None:
-        assert room_id not in self._rooms
+    @classmethod
+    def chat_channel(cls, chat_id: uuid.UUID | str) -> str:
+        return f"{cls.CHAT_CHANNEL_PREFIX}{chat_id}"
 
-        self._rooms[room_id] = dict(
-            ws=WSJWTConnectionManager()
+    @classmethod
+    def user_channel(cls, user_id: uuid.UUID | str) -> str:
+        return f"{cls.USER_CHANNEL_PREFIX}{user_id}"
+
+    async def start(self) -> None:
+        await self._broker.start(self._on_broker_message)
+        self._ws.start_heartbeat(
+            interval=self._ping_interval,
+            timeout=self._ping_timeout,
+            ping_message=views.ChatEvent(event=ChatEventType.PING).json()
         )
 
-    def is_exists(self, room_id: uuid.UUID) -> bool:
-        return room_id in self._rooms
+    async def drain(self) -> None:
+        """
+        Дослать очереди и закрыть все подключения с кодом 1001 ("going away")
+
+        Вызывается до того, как uvicorn закроет подключения сам (см. src.server).
+        """
+        await self._ws.stop_heartbeat()
+        await self._ws.drain()
+
+    async def stop(self) -> None:
+        """
+        Закрыть оставшиеся подключения и остановить брокер
+
+        """
+        await self.drain()
+        await self._broker.stop()
+
+    async def connect(
+            self,
+            websocket: WebSocket,
+            multiplexed: bool = False,
+            heartbeat: bool = False,
+            compact: bool = False
+    ) -> None:
+        """
+        Принять подключение
+
+        :param websocket:
+        :param multiplexed: подключение получает события всех своих комнат в обёртке ChatEvent,
+                            иначе - только сообщения диалога в виде MessageOutput
+        :param heartbeat: клиент получает ping и должен отвечать кадром pong
+        :param compact: профиль автора приходит в participants только с первым его сообщением
+        """
+        await self._ws.connect(websocket, heartbeat=heartbeat)
+        self._subscriptions[websocket] = set()
+        if multiplexed:
+            self._multiplexed.add(websocket)
+        if compact:
+            self._compact[websocket] = set()
+
+    async def disconnect(self, websocket: WebSocket, code: int = 1000, reason: str = None) -> None:
+        for channel in self._subscriptions.pop(websocket, set()):
+            await self._leave_room(websocket, channel)
+        self._multiplexed.discard(websocket)
+        self._compact.pop(websocket, None)
+        await self._ws.disconnect(websocket, code=code, reason=reason)
+
+    async def join(self, websocket: WebSocket, channel: str) -> None:
+        subscriptions = self._subscriptions.get(websocket)
+        if subscriptions is None or channel in subscriptions:
+            return
+        subscriptions.add(channel)
+
+        # Между проверкой и созданием комнаты нет await, поэтому одновременные
+        # подключения к одному диалогу попадают в одну и ту же комнату
+        room = self._rooms.get(channel)
+        is_new = room is None
+        if is_new:
+            room = self._rooms[channel] = Room(channel)
+        room.members.add(websocket)
+        if is_new:
+            await self._broker.subscribe(channel)
+
+    async def resume(
+            self,
+            websocket: WebSocket,
+            chat_id: uuid.UUID,
+            *,
+            last_message_id: uuid.UUID = None,
+            offset: str = None,
+            fallback: Callable[[], Awaitable[list[views.MessageOutput]]] = None
+    ) -> None:
+        """
+        Подписать подключение на диалог, предварительно дослав пропущенные сообщения
+
+        Пропуск читается из потока диалога после last_message_id (или offset). Если
+        точка продолжения уже вытеснена из потока, начало пропуска берётся из fallback (БД).
+        Живые сообщения, пришедшие во время досылки, придерживаются и отправляются
+        следом без повторов.
+
+        :param websocket:
+        :param chat_id:
+        :param last_message_id: id последнего полученного клиентом сообщения
+        :param offset: offset последнего полученного клиентом события
+        :param fallback: корутина, возвращающая пропущенные сообщения из БД
+        """
+        channel = self.chat_channel(chat_id)
+        if not self._stream or not (last_message_id or offset):
+            await self.join(websocket, channel)
+            return
+
+        sent = set()
+        self._resuming[websocket] = list()
+        try:
+            await self.join(websocket, channel)
+            try:
+                entries, is_complete = await self._stream.read_after(
+                    chat_id,
+                    message_id=str(last_message_id) if last_message_id else None,
+                    offset=offset
+                )
+            except APIError:
+                raise
+            except Exception as ex:
+                self.log.exception(f"Не удалось прочитать поток диалога {chat_id}", exc_info=ex)
+                entries, is_complete = list(), False
+
+            if not is_complete and fallback:
+                for message in await fallback():
+                    sent.add(message.id)
+                    self._deliver(websocket, views.ChatEvent(
+                        event=ChatEventType.MESSAGE,
+                        chat_id=str(chat_id),
+                        data=message
+                    ).json())
+            for entry in entries:
+                if entry.message_id in sent:
+                    continue
+                sent.add(entry.message_id)
+                event = json.loads(entry.event)
+                event["offset"] = entry.offset
+                self._deliver(websocket, json.dumps(event), dict(event=event))
+        finally:
+            for data in self._resuming.pop(websocket, ()):
+                event = json.loads(data)
+                if event["event"] == ChatEventType.MESSAGE and event["data"]["id"] in sent:
+                    continue
+                self._deliver(websocket, data, dict(event=event))
+
+    async def get_recent_message(self, chat_id: uuid.UUID, message_id: uuid.UUID) -> Optional[views.MessageOutput]:
+        """
+        Уже разосланное сообщение из потока диалога (в том числе ещё не записанное в БД)
 
-    async def send_data(self, room_id: uuid.UUID, data: dict):
-        ws: WSJWTConnectionManager = self._rooms[room_id]['ws']
-        await ws.broadcast(data)
+        :return: сообщение или None, если его нет в потоке или поток отключён
+        """
+        if not self._stream:
+            return None
+        entry = await self._stream.find(chat_id, str(message_id))
+        if entry is None:
+            return None
+        return views.MessageOutput(**json.loads(entry.event)["data"])
 
-    def get_room_ws(self, room_id: uuid.UUID) -> WSJWTConnectionManager:
-        return self._rooms[room_id]['ws']
+    async def leave(self, websocket: WebSocket, channel: str) -> None:
+        subscriptions = self._subscriptions.get(websocket)
+        if subscriptions and channel in subscriptions:
+            subscriptions.discard(channel)
+            await self._leave_room(websocket, channel)
 
-    async def close(self, room_id) -> None:
-        assert room_id in self._rooms
+    def extend(self, websocket: WebSocket, exp: int) -> None:
+        """
+        Продлить авторизацию подключения до exp (unix-время)
 
-        await self._rooms[room_id]['ws'].close(
-            code=1000,
-            reason='Terminal closed'
+        """
+        self._ws.extend(websocket, exp)
+
+    def is_joined(self, websocket: WebSocket, channel: str) -> bool:
+        return channel in self._subscriptions.get(websocket, ())
+
+    async def receive_text(self, websocket: WebSocket) -> Optional[str]:
+        return await self._ws.receive_text(websocket)
+
+    async def send_data(self, chat_id: uuid.UUID, data: views.MessageOutput) -> None:
+        """
+        Отправить сообщение во все подключения диалога,
+        в том числе обслуживаемые другими воркерами
+
+        """
+        event = views.ChatEvent(event=ChatEventType.MESSAGE, chat_id=str(chat_id), data=data)
+        if self._stream:
+            event.offset = await self._stream.append(chat_id, data.id, event.json(exclude={"offset"}))
+        await self.send_event(self.chat_channel(chat_id), event)
+
+    async def send_event(self, channel: str, event: views.ChatEvent) -> None:
+        await self._broker.publish(channel, event.json())
+
+    def notify(self, websocket: WebSocket, event: views.ChatEvent) -> None:
+        """
+        Отправить событие только в одно (локальное) подключение
+
+        """
+        self._ws.enqueue(websocket, event.json())
+
+    async def close(self, code: int = 1000, reason: str = "Terminal closed") -> None:
+        for websocket in list(self._subscriptions):
+            await self.disconnect(websocket, code=code, reason=reason)
+
+    def stats(self) -> dict:
+        """
+        Кол-во комнат и подключений воркера и оценка занимаемой ими памяти, байт
+
+        """
+        rooms_size = sys.getsizeof(self._rooms) + sum(
+            sys.getsizeof(room) + sys.getsizeof(room.members) + sys.getsizeof(channel)
+            for channel, room in self._rooms.items()
+        )
+        return dict(
+            rooms=len(self._rooms),
+            connections=len(self._subscriptions),
+            memberships=sum(len(room) for room in self._rooms.values()),
+            rooms_bytes=rooms_size,
+            connections_bytes=self._ws.memory_usage()
         )
-        self._rooms.pop(room_id)
+
+    async def _leave_room(self, websocket: WebSocket, channel: str) -> None:
+        room = self._rooms.get(channel)
+        if room is None:
+            return
+        room.members.discard(websocket)
+        if not room.members:
+            del self._rooms[channel]
+            await self._broker.unsubscribe(channel)
+            if channel in self._rooms:
+                # Пока шла отписка, в комнату успели войти заново
+                await self._broker.subscribe(channel)
+
+    def _deliver(self, websocket: WebSocket, data: str, encoded: dict = None) -> None:
+        """
+        Поставить событие в очередь подключения в формате этого подключения
+
+        :param websocket:
+        :param data: событие ChatEvent в json
+        :param encoded: разобранное событие и его кодировки, общие для одной рассылки,
+                        чтобы не кодировать одно и то же для каждого подключения
+        """
+        encoded = encoded if encoded is not None else dict()
+        is_multiplexed = websocket in self._multiplexed
+        known_participants = self._compact.get(websocket)
+        if is_multiplexed and known_participants is None:
+            self._ws.enqueue(websocket, data)
+            return
+
+        event = encoded.get("event")
+        if event is None:
+            event = encoded["event"] = json.loads(data)
+        if event["event"] != ChatEventType.MESSAGE:
+            # Подключения к одному диалогу получают только сообщения
+            if is_multiplexed:
+                self._ws.enqueue(websocket, data)
+            return
+
+        with_profile = False
+        if known_participants is not None:
+            owner_id = event["data"]["owner_id"]
+            with_profile = owner_id not in known_participants
+            known_participants.add(owner_id)
+        key = (is_multiplexed, known_participants is not None, with_profile)
+        frame = encoded.get(key)
+        if frame is None:
+            frame = encoded[key] = self._encode_message(
+                event,
+                is_multiplexed=is_multiplexed,
+                is_compact=known_participants is not None,
+                with_profile=with_profile
+            )
+        self._ws.enqueue(websocket, frame)
+
+    @classmethod
+    def _encode_message(cls, event: dict, is_multiplexed: bool, is_compact: bool, with_profile: bool) -> str:
+        message = event["data"]
+        participants = None
+        if is_compact:
+            if with_profile:
+                participants = {
+                    message["owner_id"]: dict(id=message["owner_id"], **{
+                        field: message[field] for field in cls.PARTICIPANT_FIELDS
+                    })
+                }
+            message = {key: value for key, value in message.items() if key not in cls.PARTICIPANT_FIELDS}
+
+        if is_multiplexed:
+            return json.dumps(dict(event, data=message, participants=participants))
+        # Подключения к одному диалогу получают сообщение без обёртки,
+        # но с offset, чтобы было с чего продолжить после переподключения
+        if participants:
+            message = dict(message, participants=participants)
+        if event.get("offset"):
+            message = dict(message, offset=event["offset"])
+        return json.dumps(message)
+
+    async def _on_broker_message(self, channel: str, data: str) -> None:
+        room = self._rooms.get(channel)
+        if not room:
+            return
+
+        encoded = dict()
+        for websocket in room:
+            buffer = self._resuming.get(websocket)
+            if buffer is not None:
+                buffer.append(data)
+                continue
+            self._deliver(websocket, data, encoded)
+
+        if channel.startswith(self.USER_CHANNEL_PREFIX):
+            event = encoded.get("event") or json.loads(data)
+            if event["event"] == ChatEventType.DIALOG_CREATED:
+                # События нового диалога приходят в уже открытое подключение пользователя
+                for websocket in room:
+                    await self.join(websocket, self.chat_channel(event["chat_id"]))
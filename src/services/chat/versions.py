@@ -0,0 +1,66 @@
+import hashlib
+import uuid
+from typing import Iterable
+
+from src.services.repository.user_chat import UserChatAssociationRepo
+from src.utils import RedisClient
+
+
+class ChatVersions:
+    """
+    Штампы версий диалогов и списков диалогов пользователей в redis
+
+    Штамп меняется при новом сообщении, изменении прочитанности и составе диалогов
+    и служит основой ETag: пока штамп прежний, ответ не изменился, и его можно
+    не собирать заново из Postgres. Штамп - случайная строка, а не счётчик, чтобы
+    после потери ключа новый штамп не совпал ни с одним из выданных ранее.
+    """
+
+    CHAT_KEY_PREFIX = "version:chat:"
+    USER_KEY_PREFIX = "version:user:"
+    EXPIRE = 2592000  # 30 дней
+
+    def __init__(self, redis_client: RedisClient):
+        self._redis_client = redis_client
+
+    async def chat(self, chat_id: uuid.UUID | str) -> str:
+        return await self._get(f"{self.CHAT_KEY_PREFIX}{chat_id}")
+
+    async def user(self, user_id: uuid.UUID | str) -> str:
+        return await self._get(f"{self.USER_KEY_PREFIX}{user_id}")
+
+    async def bump(self, chat_ids: Iterable = (), user_ids: Iterable = ()) -> None:
+        keys = [f"{self.CHAT_KEY_PREFIX}{chat_id}" for chat_id in chat_ids] + \
+               [f"{self.USER_KEY_PREFIX}{user_id}" for user_id in user_ids]
+        if keys:
+            await self._redis_client.mset({key: uuid.uuid4().hex for key in keys}, expire=self.EXPIRE)
+
+    async def bump_chats(self, user_chat_repo: UserChatAssociationRepo, chat_ids: Iterable[uuid.UUID]) -> None:
+        """
+        Обновить штампы диалогов и списков диалогов всех их участников
+
+        """
+        chat_ids = list(set(chat_ids))
+        if not chat_ids:
+            return
+        members = await user_chat_repo.get_members(chat_ids)
+        await self.bump(chat_ids, {user_id for _, user_id, _ in members})
+
+    @staticmethod
+    def etag(version: str, *variant: str) -> str:
+        """
+        Сильный ETag ответа: штамп версии плюс всё, от чего ещё зависит ответ
+        (параметры запроса)
+
+        """
+        digest = hashlib.sha1("|".join((version, *variant)).encode()).hexdigest()
+        return f'"{digest}"'
+
+    async def _get(self, key: str) -> str:
+        version = await self._redis_client.get(key)
+        if version:
+            return version
+        version = uuid.uuid4().hex
+        if await self._redis_client.setnx(key, version, expire=self.EXPIRE):
+            return version
+        return await self._redis_client.get(key) or version
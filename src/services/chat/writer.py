@@ -0,0 +1,145 @@
+import asyncio
+import dataclasses
+import datetime
+import logging
+import uuid
+from typing import Awaitable, Callable, Optional
+
+from sqlalchemy import insert
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import sessionmaker
+
+from src.models import tables
+from src.services.repository import ChatRepo
+
+
+@dataclasses.dataclass
+class PendingMessage:
+    id: uuid.UUID
+    chat_id: uuid.UUID
+    owner_id: uuid.UUID
+    text: Optional[str]
+    create_at: datetime.datetime
+    is_read: bool = False
+    update_at: Optional[datetime.datetime] = None
+
+    def row(self) -> dict:
+        return dict(
+            id=self.id,
+            chat_id=self.chat_id,
+            owner_id=self.owner_id,
+            text=self.text,
+            create_at=self.create_at,
+            is_read=self.is_read
+        )
+
+
+class MessageWriter:
+    """
+    Отложенная (write-behind) запись сообщений чата
+
+    Сообщения складываются в ограниченную очередь, а фоновая задача
+    записывает их пачками: один многострочный INSERT, одно обновление
+    сводки диалогов и один commit на пачку. При остановке очередь дописывается.
+    После commit вызывается on_commit (например, для обновления штампов версий).
+
+    Сообщение рассылается до записи: если строка не запишется (ошибка БД, падение
+    воркера до сброса очереди), получатели его уже видели, а в истории его не будет.
+    Поэтому сообщения с вложениями сюда не попадают, а режим выключен по умолчанию.
+    """
+
+    BATCH_SIZE = 500
+    FLUSH_INTERVAL = 0.05  # секунд
+    QUEUE_SIZE = 10000
+
+    def __init__(
+            self,
+            db_session: sessionmaker,
+            *,
+            batch_size: int = None,
+            flush_interval: float = None,
+            queue_size: int = None,
+            on_commit: Callable[[AsyncSession, list[PendingMessage]], Awaitable[None]] = None
+    ):
+        self._db_session = db_session
+        self._batch_size = batch_size if batch_size else self.BATCH_SIZE
+        self._flush_interval = flush_interval if flush_interval else self.FLUSH_INTERVAL
+        self._queue: asyncio.Queue = asyncio.Queue(maxsize=queue_size if queue_size else self.QUEUE_SIZE)
+        self._task: Optional[asyncio.Task] = None
+        self._on_commit = on_commit
+        self.log = logging.getLogger(__name__)
+
+    async def start(self) -> None:
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        """
+        Дописать всё, что осталось в очереди, и остановить задачу записи
+        """
+        if not self._task:
+            return
+        await self._queue.put(None)
+        await self._task
+        self._task = None
+
+    async def put(self, message: PendingMessage) -> None:
+        """
+        Поставить сообщение в очередь на запись
+
+        Если очередь заполнена, ожидает освобождения места (backpressure)
+        """
+        await self._queue.put(message)
+
+    def pending(self) -> int:
+        return self._queue.qsize()
+
+    async def _run(self) -> None:
+        loop = asyncio.get_running_loop()
+        is_stopping = False
+        while not is_stopping:
+            message = await self._queue.get()
+            if message is None:
+                break
+
+            batch = [message]
+            deadline = loop.time() + self._flush_interval
+            while len(batch) < self._batch_size:
+                timeout = deadline - loop.time()
+                try:
+                    message = self._queue.get_nowait() if timeout <= 0 else \
+                        await asyncio.wait_for(self._queue.get(), timeout)
+                except (asyncio.QueueEmpty, asyncio.TimeoutError):
+                    break
+                if message is None:
+                    is_stopping = True
+                    break
+                batch.append(message)
+
+            await self._flush(batch)
+
+    async def _flush(self, batch: list[PendingMessage]) -> None:
+        try:
+            await self._write(batch)
+        except Exception as ex:
+            self.log.exception(f"Не удалось записать пачку из {len(batch)} сообщений, запись по одному", exc_info=ex)
+            # Одно ошибочное сообщение не должно потянуть за собой всю пачку
+            for message in batch:
+                try:
+                    await self._write([message])
+                except Exception as ex:
+                    self.log.exception(f"Сообщение {message.id} не записано", exc_info=ex)
+
+    async def _write(self, batch: list[PendingMessage]) -> None:
+        async with self._db_session() as session:
+            await session.execute(insert(tables.Message).values([message.row() for message in batch]))
+            await ChatRepo(session).set_last_messages(
+                (message.chat_id, message.id, message.create_at, message.text) for message in batch
+            )
+            await session.commit()
+
+            if self._on_commit:
+                # Пачка уже записана: ошибка здесь не должна приводить к повторной записи
+                try:
+                    await self._on_commit(session, batch)
+                except Exception as ex:
+                    self.log.exception("Ошибка обработчика после записи пачки", exc_info=ex)
@@ -1,5 +1,8 @@
+import asyncio
 import logging
+import sys
 import time
+from typing import Optional
 
 from fastapi.websockets import WebSocket
 from fastapi.websockets import WebSocketState
@@ -8,19 +11,68 @@ from fastapi.websockets import WebSocketDisconnect
 from src.exceptions import AccessDenied
 
 
+class WSConnection:
+    """
+    Подключение с собственной очередью исходящих сообщений
+
+    Очередь разбирается отдельной задачей-писателем, поэтому
+    медленный клиент не задерживает отправку остальным.
+    """
+    __slots__ = ("websocket", "queue", "writer", "expiry", "heartbeat", "last_seen")
+
+    def __init__(self, websocket: WebSocket, queue_size: int, heartbeat: bool = False):
+        self.websocket = websocket
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize=queue_size)
+        self.writer: Optional[asyncio.Task] = None
+        self.expiry: Optional[asyncio.TimerHandle] = None
+        self.heartbeat = heartbeat
+        self.last_seen = asyncio.get_running_loop().time()
+
+    def cancel(self) -> None:
+        """
+        Остановить фоновые задачи подключения
+        """
+        if self.writer and self.writer is not asyncio.current_task():
+            self.writer.cancel()
+        if self.expiry:
+            self.expiry.cancel()
+
+
 class WSConnectionManager:
-    def __init__(self):
-        self.active_connections: list[WebSocket] = []
+    SEND_QUEUE_SIZE = 256
+    DRAIN_TIMEOUT = 1.0
+    SLOW_CONSUMER_CODE = 1013  # Try Again Later
+    GOING_AWAY_CODE = 1001
+    IDLE_CODE = 4080  # 408 Request Timeout
+
+    def __init__(self, send_queue_size: int = None):
+        self.active_connections: dict[WebSocket, WSConnection] = {}
+        self._send_queue_size = send_queue_size if send_queue_size else self.SEND_QUEUE_SIZE
+        self._closing: set[asyncio.Task] = set()
+        self._heartbeat: Optional[asyncio.Task] = None
+
+    async def connect(self, websocket: WebSocket, heartbeat: bool = False) -> None:
+        """
+        Принять подключение
 
-    async def connect(self, websocket: WebSocket) -> None:
+        :param websocket:
+        :param heartbeat: клиент отвечает на ping, подключение закрывается,
+                          если от него ничего не приходит дольше таймаута
+        """
         await websocket.accept()
-        self.active_connections.append(websocket)
+        connection = WSConnection(websocket, self._send_queue_size, heartbeat=heartbeat)
+        connection.writer = asyncio.create_task(self._write(connection))
+        self.active_connections[websocket] = connection
 
     async def disconnect(self, websocket: WebSocket, code: int = 1000, reason: str = None) -> None:
+        connection = self.active_connections.pop(websocket, None)
+        if connection:
+            connection.cancel()
         if websocket.client_state == WebSocketState.CONNECTED:
-            await websocket.close(code=code, reason=reason)
-        if websocket in self.active_connections:
-            self.active_connections.remove(websocket)
+            try:
+                await websocket.close(code=code, reason=reason)
+            except RuntimeError:
+                pass
 
     async def send_message(self, websocket: WebSocket, *, message: str | dict | bytes, json_mode: str = "binary"):
         if websocket.client_state == WebSocketState.CONNECTED:
@@ -33,6 +85,26 @@ class WSConnectionManager:
             else:
                 raise TypeError("Message type not supported")
 
+    def enqueue(self, websocket: WebSocket, message: str | dict | bytes) -> bool:
+        """
+        Поставить сообщение в очередь подключения без ожидания
+
+        Если очередь переполнена, клиент считается медленным
+        и отключается с кодом SLOW_CONSUMER_CODE.
+
+        :return: True, если сообщение поставлено в очередь
+        """
+        connection = self.active_connections.get(websocket)
+        if not connection:
+            return False
+        try:
+            connection.queue.put_nowait(message)
+        except asyncio.QueueFull:
+            logging.debug(f"Очередь подключения {websocket.client} переполнена, отключение")
+            self._drop(websocket, code=self.SLOW_CONSUMER_CODE, reason="Slow consumer")
+            return False
+        return True
+
     def connections(self) -> int:
         """
         Кол-во активных подключений
@@ -42,53 +114,149 @@ class WSConnectionManager:
 
     async def receive_text(self, websocket: WebSocket) -> str:
         try:
-            return await websocket.receive_text()
+            data = await websocket.receive_text()
         except (WebSocketDisconnect, RuntimeError):
             await self.disconnect(websocket)
+            return
+        self._touch(websocket)
+        return data
 
     async def receive_json(self, websocket: WebSocket) -> dict:
         try:
-            return await websocket.receive_json(mode="text")
+            data = await websocket.receive_json(mode="text")
         except (WebSocketDisconnect, RuntimeError):
             await self.disconnect(websocket)
+            return
+        self._touch(websocket)
+        return data
 
     async def broadcast(self, data: any) -> None:
-        for connection in self.active_connections:
-            if connection.client_state == WebSocketState.CONNECTED:
-                await self.send_message(connection, message=data)
+        for websocket in list(self.active_connections):
+            if websocket.client_state == WebSocketState.CONNECTED:
+                self.enqueue(websocket, data)
             else:
-                await self.disconnect(connection)
+                await self.disconnect(websocket)
 
     async def close(self, code: int = 1000, reason: str = "The connection was closed") -> None:
-        for connection in self.active_connections:
-            await self.disconnect(connection, code=code, reason=reason)
+        for websocket in list(self.active_connections):
+            await self.disconnect(websocket, code=code, reason=reason)
+
+    async def drain(self, timeout: float = None, reason: str = "Server is going away") -> None:
+        """
+        Дать писателям дослать очереди и закрыть все подключения с кодом 1001,
+        чтобы клиенты переподключились к другому воркеру
 
+        :param timeout: сколько ждать опустошения очередей, сек
+        """
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + (timeout if timeout is not None else self.DRAIN_TIMEOUT)
+        while loop.time() < deadline and any(not c.queue.empty() for c in self.active_connections.values()):
+            await asyncio.sleep(0.05)
 
-def _ws_jwt_auth(func):
-    async def wrapper(*args, **kwargs):
-        cls_self: WSJWTConnectionManager = args[0]
-        websocket: WebSocket = args[1]
-        current_user = websocket.scope['user']
-        if current_user.access_exp < time.time():
-            await cls_self.disconnect(websocket, int(f'{AccessDenied.status_code}0'), AccessDenied.message)
-            return
-        return await func(*args, **kwargs)
+        await asyncio.gather(
+            *(
+                self.disconnect(websocket, code=self.GOING_AWAY_CODE, reason=reason)
+                for websocket in list(self.active_connections)
+            ),
+            return_exceptions=True
+        )
+
+    def start_heartbeat(self, interval: float, timeout: float, ping_message: str) -> None:
+        """
+        Запустить фоновую проверку подключений
+
+        Раз в interval секунд подключениям с heartbeat отправляется ping_message,
+        а те, от кого ничего не приходило дольше timeout, закрываются. Подключения,
+        уже закрытые клиентом, освобождаются независимо от heartbeat.
+        """
+        if interval and not self._heartbeat:
+            self._heartbeat = asyncio.create_task(self._run_heartbeat(interval, timeout, ping_message))
+
+    async def stop_heartbeat(self) -> None:
+        if self._heartbeat:
+            self._heartbeat.cancel()
+            try:
+                await self._heartbeat
+            except asyncio.CancelledError:
+                pass
+            self._heartbeat = None
+
+    async def _run_heartbeat(self, interval: float, timeout: float, ping_message: str) -> None:
+        loop = asyncio.get_running_loop()
+        while True:
+            await asyncio.sleep(interval)
+            now = loop.time()
+            for websocket, connection in list(self.active_connections.items()):
+                if websocket.client_state != WebSocketState.CONNECTED:
+                    self._drop(websocket, code=1000, reason=None)
+                elif not connection.heartbeat:
+                    continue
+                elif now - connection.last_seen > timeout:
+                    self._drop(websocket, code=self.IDLE_CODE, reason="Heartbeat timeout")
+                else:
+                    self.enqueue(websocket, ping_message)
+
+    def memory_usage(self) -> int:
+        """
+        Оценка памяти, занимаемой учётом подключений (без буферов самих сокетов), байт
 
-    return wrapper
+        """
+        return sys.getsizeof(self.active_connections) + sum(
+            sys.getsizeof(connection) + sys.getsizeof(connection.queue) + sys.getsizeof(connection.queue._queue)
+            for connection in self.active_connections.values()
+        )
+
+    def _touch(self, websocket: WebSocket) -> None:
+        connection = self.active_connections.get(websocket)
+        if connection:
+            connection.last_seen = asyncio.get_running_loop().time()
+
+    async def _write(self, connection: WSConnection) -> None:
+        websocket = connection.websocket
+        try:
+            while True:
+                message = await connection.queue.get()
+                await self.send_message(websocket, message=message)
+        except (WebSocketDisconnect, RuntimeError, ConnectionError):
+            await self.disconnect(websocket)
+
+    def _drop(self, websocket: WebSocket, code: int, reason: str) -> None:
+        connection = self.active_connections.pop(websocket, None)
+        if connection:
+            connection.cancel()
+        # Закрытие выполняется в фоне, чтобы не задерживать рассылку
+        task = asyncio.create_task(self.disconnect(websocket, code=code, reason=reason))
+        self._closing.add(task)
+        task.add_done_callback(self._closing.discard)
 
 
 class WSJWTConnectionManager(WSConnectionManager):
     """
     Менеджер подключений для ws с авторизацией по JWT
 
+    Срок действия access-токена проверяется не при каждой отправке, а одним
+    таймером на подключение: по его истечении подключение закрывается,
+    если клиент не продлил его (см. extend).
     """
+    EXPIRED_CODE = int(f'{AccessDenied.status_code}0')
 
-    def __init__(self):
-        # todo
-        super().__init__()
-
-    @_ws_jwt_auth
-    async def send_message(self, websocket: WebSocket, *, message: str | dict | bytes, json_mode: str = "binary"):
-        await super().send_message(websocket, message=message, json_mode=json_mode)
+    async def connect(self, websocket: WebSocket, heartbeat: bool = False) -> None:
+        await super().connect(websocket, heartbeat=heartbeat)
+        self.extend(websocket, websocket.scope['user'].access_exp)
 
+    def extend(self, websocket: WebSocket, exp: int) -> None:
+        """
+        Назначить (перенести) момент истечения авторизации подключения
 
+        :param websocket:
+        :param exp: unix-время истечения
+        """
+        connection = self.active_connections.get(websocket)
+        if not connection:
+            return
+        if connection.expiry:
+            connection.expiry.cancel()
+        connection.expiry = asyncio.get_running_loop().call_later(
+            max(exp - time.time(), 0),
+            self._drop, websocket, self.EXPIRED_CODE, AccessDenied.message
+        )
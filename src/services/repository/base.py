@@ -1,14 +1,28 @@
 import uuid
-from typing import Generic, Type, TypeVar, Optional
+from datetime import datetime
+from typing import Any, AsyncIterator, Generic, Iterator, Optional, Sequence, Type, TypeVar
 
-from sqlalchemy import insert, update, delete, func, select, desc, and_
+from sqlalchemy import insert, update, delete, func, select, and_, tuple_
+from sqlalchemy.dialects.postgresql import insert as pg_insert
 from sqlalchemy.ext.asyncio import AsyncSession
 
+from src.utils import cursor
+
 T = TypeVar('T')
 
 
 class BaseRepository(Generic[T]):
+    """
+    Репозитории не фиксируют транзакцию: commit (или rollback) выполняет владелец
+    сессии - UnitOfWorkRoute для http-запроса, сервис для сообщения ws
+    """
     table: Type[T]
+    # Строк (значений фильтра) на один запрос в пакетных операциях;
+    # для широких таблиц уменьшается, чтобы не превысить лимит параметров Postgres
+    CHUNK_SIZE = 1000
+    MAX_PARAMS = 32767
+    PAGE_SIZE = 50
+    MAX_PAGE_SIZE = 100
 
     def __init__(self, conn: AsyncSession):
         self._conn = conn
@@ -21,9 +35,119 @@ class BaseRepository(Generic[T]):
         :return:
         """
         data = await self._conn.execute(insert(self.table).values(**kwargs))
-        await self._conn.commit()
         return data.inserted_primary_key[0]  # todo: normalize it
 
+    async def create_returning(self, **kwargs) -> T:
+        """
+        Создает запись в БД и возвращает её целиком
+        (INSERT ... RETURNING, без повторного чтения)
+
+        :param kwargs:
+        :return:
+        """
+        data = await self._conn.execute(insert(self.table).values(**kwargs).returning(self.table))
+        return data.scalars().one()
+
+    async def create_many(self, rows: Sequence[dict]) -> list[T]:
+        """
+        Создает записи многострочным INSERT ... RETURNING, порциями по CHUNK_SIZE
+
+        :param rows: значения колонок; набор ключей во всех строках одинаков
+        :return: созданные записи
+        """
+        records = list()
+        for chunk in self._chunks(rows):
+            data = await self._conn.execute(insert(self.table).values(chunk).returning(self.table))
+            records.extend(data.scalars().all())
+        return records
+
+    async def upsert(
+            self,
+            rows: Sequence[dict],
+            index_elements: Sequence[str] = None,
+            update_columns: Sequence[str] = None
+    ) -> list[T]:
+        """
+        Создает или обновляет записи (INSERT ... ON CONFLICT DO UPDATE ... RETURNING),
+        порциями по CHUNK_SIZE
+
+        Строки с одинаковым ключом конфликта схлопываются в последнюю из них:
+        один INSERT не может обновить строку дважды.
+
+        :param rows: значения колонок; набор ключей во всех строках одинаков
+        :param index_elements: колонки уникального ключа конфликта, по умолчанию - первичный ключ
+        :param update_columns: что обновлять при конфликте, по умолчанию - все переданные колонки,
+                               кроме ключа; пустой список - не обновлять (DO NOTHING)
+        :return: созданные и обновлённые записи (без пропущенных при DO NOTHING)
+        """
+        if not rows:
+            return list()
+        if index_elements is None:
+            index_elements = [column.name for column in self.table.__table__.primary_key.columns]
+        if update_columns is None:
+            update_columns = [column for column in rows[0] if column not in index_elements]
+        if update_columns:
+            rows = self._unique_rows(rows, index_elements)
+
+        records = list()
+        for chunk in self._chunks(rows):
+            request = pg_insert(self.table).values(chunk)
+            if update_columns:
+                request = request.on_conflict_do_update(
+                    index_elements=index_elements,
+                    set_={column: request.excluded[column] for column in update_columns}
+                )
+            else:
+                request = request.on_conflict_do_nothing(index_elements=index_elements)
+            data = await self._conn.execute(request.returning(self.table))
+            records.extend(data.scalars().all())
+        return records
+
+    async def update_where(self, values: dict, **kwargs) -> int:
+        """
+        Обновляет все записи, подходящие под фильтр
+
+        Значение фильтра-списка превращается в IN; длинный список
+        разбивается на запросы по CHUNK_SIZE значений.
+
+        :param values: новые значения колонок
+        :param kwargs: фильтр, например id=[...], message_id=None; без фильтра ничего не обновляется
+        :return: кол-во обновлённых записей
+        """
+        if not kwargs:
+            raise ValueError("update_where без фильтра обновил бы всю таблицу")
+        if not values:
+            return 0
+        count = 0
+        for conditions in self._chunked_conditions(kwargs):
+            data = await self._conn.execute(
+                update(self.table)
+                .where(*conditions)
+                .values(**values)
+                .execution_options(synchronize_session=False)
+            )
+            count += data.rowcount
+        return count
+
+    async def delete_where(self, **kwargs) -> int:
+        """
+        Удаляет все записи, подходящие под фильтр (см. update_where)
+
+        :param kwargs: фильтр; без фильтра ничего не удаляется
+        :return: кол-во удалённых записей
+        """
+        if not kwargs:
+            raise ValueError("delete_where без фильтра удалил бы всю таблицу")
+        count = 0
+        for conditions in self._chunked_conditions(kwargs):
+            data = await self._conn.execute(
+                delete(self.table)
+                .where(*conditions)
+                .execution_options(synchronize_session=False)
+            )
+            count += data.rowcount
+        return count
+
     async def get(self, **kwargs) -> Optional[T]:
         """
         Получает запись
@@ -36,15 +160,77 @@ class BaseRepository(Generic[T]):
     async def get_all(self, **kwargs) -> list[Optional[T]]:
         """
         Получает все записи
-        (лимит 100)
+        (лимит 100, для списков - get_page)
 
         :param kwargs:
         :return:
         """
         return (await self._conn.execute(select(self.table).filter_by(**kwargs).limit(100))).scalars().all()
 
-    async def get_range(self, count: int, column, **kwargs):
-        return (await self._conn.execute(select(self.table).filter_by(**kwargs).order_by(desc(column)).limit(count))).scalars().all()
+    async def get_page(
+            self,
+            limit: int = None,
+            *,
+            order_by: str = None,
+            descending: bool = False,
+            after: str = None,
+            **kwargs
+    ) -> tuple[list[T], Optional[str]]:
+        """
+        Страница записей с keyset-пагинацией по (order_by, первичный ключ)
+
+        Читает не больше limit + 1 строк при любой глубине страницы, если по order_by
+        есть индекс. Колонка order_by не должна содержать NULL.
+
+        :param limit: размер страницы, по умолчанию PAGE_SIZE, не больше MAX_PAGE_SIZE
+        :param order_by: колонка сортировки, по умолчанию - только первичный ключ
+        :param descending: от больших значений к меньшим
+        :param after: курсор из предыдущей страницы
+        :param kwargs: фильтр, как в get_all
+        :return: (записи, курсор следующей страницы или None, если записей больше нет)
+        :raises ValueError: при некорректном курсоре или размере страницы
+        """
+        limit = limit if limit else self.PAGE_SIZE
+        if limit < 1:
+            raise ValueError("Размер страницы должен быть положительным")
+        limit = min(limit, self.MAX_PAGE_SIZE)
+
+        columns = self._key_columns(order_by)
+        request = select(self.table).filter_by(**kwargs)
+        if after:
+            values = cursor.decode_key_cursor(after)
+            if len(values) != len(columns):
+                raise ValueError(f"Некорректный курсор {after!r}")
+            position = tuple_(*[self._coerce(column, value) for column, value in zip(columns, values)])
+            key = tuple_(*columns)
+            request = request.where(key < position if descending else key > position)
+        request = request \
+            .order_by(*[column.desc() if descending else column for column in columns]) \
+            .limit(limit + 1)
+
+        records = (await self._conn.execute(request)).scalars().all()
+        next_cursor = None
+        if len(records) > limit:
+            records = records[:limit]
+            next_cursor = cursor.encode_key_cursor([getattr(records[-1], column.key) for column in columns])
+        return records, next_cursor
+
+    async def stream(self, order_by: str = None, chunk_size: int = None, **kwargs) -> AsyncIterator[T]:
+        """
+        Все записи по одной через серверный курсор, порциями по chunk_size,
+        без загрузки таблицы в память - для фоновых задач
+
+        :param order_by: колонка сортировки, по умолчанию - только первичный ключ
+        :param chunk_size: строк на одно чтение из курсора, по умолчанию CHUNK_SIZE
+        :param kwargs: фильтр, как в get_all
+        """
+        request = select(self.table) \
+            .filter_by(**kwargs) \
+            .order_by(*self._key_columns(order_by)) \
+            .execution_options(yield_per=chunk_size if chunk_size else self.CHUNK_SIZE)
+        result = await self._conn.stream_scalars(request)
+        async for record in result:
+            yield record
 
     async def update(self, id: any, **kwargs) -> None:
         """
@@ -56,7 +242,6 @@ class BaseRepository(Generic[T]):
         """
         if kwargs:
             await self._conn.execute(update(self.table).where(self.table.id == id).values(**kwargs))
-            await self._conn.commit()
 
     async def delete(self, id: any) -> None:
         """
@@ -66,7 +251,6 @@ class BaseRepository(Generic[T]):
         :return:
         """
         await self._conn.execute(delete(self.table).where(self.table.id == id))
-        await self._conn.commit()
 
     async def count(self, **kwargs) -> int:
         """
@@ -84,3 +268,76 @@ class BaseRepository(Generic[T]):
     @property
     def session(self):
         return self._conn
+
+    def _key_columns(self, order_by: Optional[str]) -> list:
+        primary_key = [getattr(self.table, column.key) for column in self.table.__table__.primary_key.columns]
+        if not order_by or order_by in [column.key for column in primary_key]:
+            return primary_key
+        return [getattr(self.table, order_by), *primary_key]
+
+    @staticmethod
+    def _coerce(column, value: Any) -> Any:
+        """
+        Значение курсора в тип колонки
+
+        :raises ValueError: если значение пустое или не приводится к типу колонки
+        """
+        if value is None:
+            raise ValueError(f"Пустое значение {column.key!r} в курсоре")
+        python_type = column.type.python_type
+        try:
+            if python_type is datetime:
+                return datetime.fromisoformat(value)
+            if python_type is uuid.UUID:
+                return uuid.UUID(value)
+            return python_type(value)
+        except (TypeError, AttributeError, ValueError) as ex:
+            raise ValueError(f"Некорректное значение {column.key!r} в курсоре") from ex
+
+    @staticmethod
+    def _unique_rows(rows: Sequence[dict], key_columns: Sequence[str]) -> Sequence[dict]:
+        """
+        Последняя строка для каждого значения ключа, в порядке первого появления ключа
+
+        Строки без ключа или с NULL в нём не конфликтуют и остаются как есть.
+        """
+        unique = dict()
+        for i, row in enumerate(rows):
+            key = tuple(row.get(column) for column in key_columns)
+            unique[i if None in key else key] = row
+        return list(unique.values())
+
+    def _chunks(self, rows: Sequence[dict]) -> Iterator[Sequence[dict]]:
+        if not rows:
+            return
+        size = max(1, min(self.CHUNK_SIZE, self.MAX_PARAMS // max(1, len(rows[0]))))
+        for i in range(0, len(rows), size):
+            yield rows[i:i + size]
+
+    def _chunked_conditions(self, filters: dict[str, Any]) -> Iterator[list]:
+        """
+        Условия WHERE по фильтру; самый длинный фильтр-список делится на порции
+
+        """
+        scalars = list()
+        lists = dict()
+        for key, value in filters.items():
+            column = getattr(self.table, key)
+            if isinstance(value, (list, tuple, set, frozenset)):
+                lists[key] = list(value)
+            else:
+                scalars.append(column.is_(None) if value is None else column == value)
+        if any(not values for values in lists.values()):
+            return  # IN () ничего не выберет
+
+        chunked = max(lists, key=lambda key: len(lists[key]), default=None)
+        conditions = scalars + [
+            getattr(self.table, key).in_(values) for key, values in lists.items() if key != chunked
+        ]
+        if chunked is None:
+            yield conditions
+            return
+        column = getattr(self.table, chunked)
+        values = lists[chunked]
+        for i in range(0, len(values), self.CHUNK_SIZE):
+            yield conditions + [column.in_(values[i:i + self.CHUNK_SIZE])]
@@ -1,7 +1,9 @@
 import uuid
-from typing import Optional
+from datetime import datetime
+from typing import Iterable, Optional
 
-from sqlalchemy import insert, update, delete, func, select
+from sqlalchemy import insert, update, delete, func, select, or_, bindparam
+from sqlalchemy.dialects.postgresql import insert as pg_insert
 from sqlalchemy.orm import selectinload
 
 from src.models import tables
@@ -10,8 +12,120 @@ from src.services.repository.base import BaseRepository
 
 class ChatRepo(BaseRepository[tables.Chat]):
     table = tables.Chat
+    PREVIEW_LENGTH = 100
 
-    async def get_chat_with_unread_count(self, user_id: uuid.UUID) -> list[tuple[tables.Chat, int]]:
+    @staticmethod
+    def dialog_key(user_id_one: uuid.UUID, user_id_two: uuid.UUID) -> tuple[uuid.UUID, uuid.UUID]:
+        """
+        Канонический ключ личного диалога: (user_low, user_high)
+
+        """
+        return tuple(sorted((uuid.UUID(str(user_id_one)), uuid.UUID(str(user_id_two)))))
+
+    async def get_dialog_id(self, user_id_one: uuid.UUID, user_id_two: uuid.UUID) -> Optional[uuid.UUID]:
+        """
+        id личного диалога двух пользователей - одно обращение к уникальному индексу
+
+        """
+        user_low, user_high = self.dialog_key(user_id_one, user_id_two)
+        request = select(self.table.id) \
+            .where(self.table.user_low == user_low) \
+            .where(self.table.user_high == user_high)
+        return (await self._conn.execute(request)).scalar()
+
+    async def get_or_create_dialog(self, user_id_one: uuid.UUID, user_id_two: uuid.UUID) -> tuple[uuid.UUID, bool]:
+        """
+        Находит или атомарно создаёт личный диалог вместе с участниками
+
+        Диалог и обе связи user_chat создаются в транзакции вызывающего; при одновременном
+        открытии INSERT ... ON CONFLICT DO NOTHING оставляет ровно один диалог
+        (второй запрос ждёт commit первого и получает конфликт).
+
+        :return: (id диалога, создан ли он этим вызовом)
+        """
+        chat_id = await self.get_dialog_id(user_id_one, user_id_two)
+        if chat_id:
+            return chat_id, False
+
+        user_low, user_high = self.dialog_key(user_id_one, user_id_two)
+        data = await self._conn.execute(
+            pg_insert(self.table)
+            .values(id=uuid.uuid4(), user_low=user_low, user_high=user_high)
+            .on_conflict_do_nothing(index_elements=["user_low", "user_high"])
+            .returning(self.table.id)
+        )
+        chat_id = data.scalar()
+        if not chat_id:
+            # Диалог создан параллельным запросом
+            return await self.get_dialog_id(user_low, user_high), False
+
+        await self._conn.execute(insert(tables.UserChatAssociation).values([
+            dict(user_id=user_low, chat_id=chat_id),
+            dict(user_id=user_high, chat_id=chat_id)
+        ]))
+        return chat_id, True
+
+    async def set_last_messages(
+            self,
+            messages: Iterable[tuple[uuid.UUID, uuid.UUID, datetime, Optional[str]]]
+    ) -> None:
+        """
+        Обновляет сводку диалогов (последнее сообщение, превью) и время активности
+        их участников. Без commit: вызывается в транзакции записи сообщений.
+
+        Сводка не откатывается назад, если более новое сообщение уже записано.
+
+        :param messages: (chat_id, message_id, create_at, text)
+        """
+        latest = dict()
+        for chat_id, message_id, create_at, text in messages:
+            if chat_id not in latest or latest[chat_id]["b_at"] <= create_at:
+                latest[chat_id] = dict(
+                    b_chat_id=chat_id,
+                    b_message_id=message_id,
+                    b_at=create_at,
+                    b_preview=text[:self.PREVIEW_LENGTH] if text else None
+                )
+        if not latest:
+            return
+        # Один порядок блокировок строк для параллельных пачек
+        rows = [latest[chat_id] for chat_id in sorted(latest)]
+
+        chats = self.table.__table__
+        await self._conn.execute(
+            update(chats)
+            .where(chats.c.id == bindparam("b_chat_id"))
+            .where(or_(chats.c.last_message_at.is_(None), chats.c.last_message_at <= bindparam("b_at")))
+            .values(
+                last_message_id=bindparam("b_message_id"),
+                last_message_at=bindparam("b_at"),
+                last_message_preview=bindparam("b_preview")
+            ),
+            rows
+        )
+        members = tables.UserChatAssociation.__table__
+        await self._conn.execute(
+            update(members)
+            .where(members.c.chat_id == bindparam("b_chat_id"))
+            .values(last_activity_at=func.greatest(members.c.last_activity_at, bindparam("b_at"))),
+            [dict(b_chat_id=row["b_chat_id"], b_at=row["b_at"]) for row in rows]
+        )
+
+    async def get_chat_with_unread_count(
+            self,
+            user_id: uuid.UUID,
+            chat_ids: list[uuid.UUID] = None
+    ) -> list[tuple[tables.Chat, int]]:
+        """
+        Кол-во непрочитанных пользователем сообщений по диалогам
+
+        Непрочитанными считаются чужие сообщения новее отметки user_chat.last_read_at
+        (и не отмеченные прочитанными по одному - флаг is_read старых клиентов)
+
+        :param user_id:
+        :param chat_ids: ограничить выборку этими диалогами
+        :return: пары (диалог, кол-во) только для диалогов с непрочитанными
+        """
         result = (
             select(tables.Chat, func.count(tables.Message.id))
             .join(tables.UserChatAssociation)
@@ -19,6 +133,12 @@ class ChatRepo(BaseRepository[tables.Chat]):
             .where(tables.UserChatAssociation.user_id == user_id)
             .where(tables.Message.is_read == False)
             .where(tables.Message.owner_id != user_id)
+            .where(or_(
+                tables.UserChatAssociation.last_read_at.is_(None),
+                tables.Message.create_at > tables.UserChatAssociation.last_read_at
+            ))
             .group_by(tables.Chat.id)
         )
+        if chat_ids is not None:
+            result = result.where(tables.Chat.id.in_(chat_ids))
         return (await self.session.execute(result)).all()
@@ -1,6 +1,40 @@
+import uuid
+
+from sqlalchemy import select, update
+
 from src.models import tables
 from src.services.repository.base import BaseRepository
 
 
 class FileRepo(BaseRepository[tables.File]):
     table = tables.File
+
+    async def get_by_message_ids(self, message_ids: list[uuid.UUID]) -> list[tables.File]:
+        """
+        Возвращает вложения сразу нескольких сообщений одним запросом
+
+        :param message_ids:
+        :return:
+        """
+        return (await self._conn.execute(
+            select(self.table).where(self.table.message_id.in_(message_ids))
+        )).scalars().all()
+
+    async def attach_to_message(self, message_id: uuid.UUID, file_ids: list[uuid.UUID]) -> list[tables.File]:
+        """
+        Прикрепляет к сообщению свободные файлы из file_ids одним запросом
+        (UPDATE ... RETURNING)
+
+        :param message_id:
+        :param file_ids:
+        :return: фактически прикреплённые файлы
+        """
+        data = await self._conn.execute(
+            update(self.table)
+            .where(self.table.id.in_(file_ids))
+            .where(self.table.message_id.is_(None))
+            .values(message_id=message_id)
+            .returning(self.table)
+            .execution_options(synchronize_session=False)
+        )
+        return data.scalars().all()
@@ -1,7 +1,8 @@
 import uuid
+from datetime import datetime
 from typing import Optional
 
-from sqlalchemy import insert, update, delete, func, select, and_
+from sqlalchemy import insert, update, delete, func, select, and_, tuple_
 from sqlalchemy.orm import selectinload, subqueryload, joinedload, contains_eager
 
 from src.models import tables
@@ -10,6 +11,117 @@ from src.services.repository.base import BaseRepository
 
 class MessageRepo(BaseRepository[tables.Message]):
     table = tables.Message
+    SEARCH_CONFIGS = ("russian", "simple")
+    SNIPPET_OPTIONS = "MaxFragments=1, MaxWords=20, MinWords=8, StartSel=<b>, StopSel=</b>"
+
+    async def search(
+            self,
+            user_id: uuid.UUID,
+            text: str,
+            limit: int,
+            chat_id: uuid.UUID = None,
+            before: tuple[float, datetime, uuid.UUID] = None
+    ) -> list[tuple[tables.Message, float, Optional[str]]]:
+        """
+        Полнотекстовый поиск по сообщениям диалогов пользователя
+        (GIN-индекс по search_vector, keyset-пагинация по (rank, create_at, id))
+
+        Фрагмент с подсветкой строится только для строк страницы. Текст экранируется
+        до ts_headline, поэтому в фрагменте безопасна только разметка <b></b>.
+
+        :param user_id: искать только в диалогах этого пользователя
+        :param text: запрос в синтаксисе websearch_to_tsquery
+        :param limit:
+        :param chat_id: ограничить поиск одним диалогом
+        :param before: вернуть результаты строго после этой позиции
+        :return: тройки (сообщение, ранг, фрагмент) от лучших к худшим
+        """
+        ts_query = func.websearch_to_tsquery(self.SEARCH_CONFIGS[0], text)
+        for config in self.SEARCH_CONFIGS[1:]:
+            ts_query = ts_query.op("||")(func.websearch_to_tsquery(config, text))
+        rank = func.ts_rank(self.table.search_vector, ts_query)
+
+        members = tables.UserChatAssociation
+        hits = (
+            select(self.table.id, rank.label("rank"))
+            .join(members, and_(members.chat_id == self.table.chat_id, members.user_id == user_id))
+            .where(self.table.search_vector.op("@@")(ts_query))
+        )
+        if chat_id:
+            hits = hits.where(self.table.chat_id == chat_id)
+        if before:
+            hits = hits.where(tuple_(rank, self.table.create_at, self.table.id) < tuple_(*before))
+        hits = hits.order_by(rank.desc(), self.table.create_at.desc(), self.table.id.desc()).limit(limit).subquery()
+
+        escaped = self.table.text
+        for char, entity in (("&", "&amp;"), ("<", "&lt;"), (">", "&gt;")):
+            escaped = func.replace(escaped, char, entity)
+        query = (
+            select(
+                self.table,
+                hits.c.rank,
+                func.ts_headline(self.SEARCH_CONFIGS[0], escaped, ts_query, self.SNIPPET_OPTIONS)
+            )
+            .join(hits, hits.c.id == self.table.id)
+            .order_by(hits.c.rank.desc(), self.table.create_at.desc(), self.table.id.desc())
+        )
+        return (await self._conn.execute(query)).tuples().all()
+
+    async def get_history(
+            self,
+            chat_id: uuid.UUID,
+            limit: int,
+            before: tuple[datetime, uuid.UUID] = None,
+            after: tuple[datetime, uuid.UUID] = None
+    ) -> list[tuple[tables.Message, tables.User]]:
+        """
+        Страница истории диалога вместе с авторами сообщений одним запросом
+        (keyset-пагинация по (create_at, id))
+
+        Без before/after возвращаются последние сообщения. Запрос читает не больше
+        limit строк индекса независимо от длины диалога.
+
+        :param chat_id:
+        :param limit:
+        :param before: вернуть сообщения строго старше этой позиции
+        :param after: вернуть сообщения строго новее этой позиции
+        :return: пары (сообщение, автор) от новых к старым (от старых к новым, если передан after)
+        """
+        key = tuple_(self.table.create_at, self.table.id)
+        query = (
+            select(self.table, tables.User)
+            .join(tables.User, tables.User.id == self.table.owner_id)
+            .where(self.table.chat_id == chat_id)
+        )
+        if after:
+            query = query.where(key > tuple_(*after)).order_by(self.table.create_at, self.table.id)
+        else:
+            if before:
+                query = query.where(key < tuple_(*before))
+            query = query.order_by(self.table.create_at.desc(), self.table.id.desc())
+        return (await self._conn.execute(query.limit(limit))).tuples().all()
+
+    async def get_after(
+            self,
+            chat_id: uuid.UUID,
+            since: datetime,
+            limit: int,
+            exclude_id: uuid.UUID = None
+    ) -> list[tables.Message]:
+        """
+        Возвращает первые limit сообщений диалога, созданных не раньше since,
+        от старых к новым
+
+        :param chat_id:
+        :param since:
+        :param limit:
+        :param exclude_id: сообщение, от которого ведётся отсчёт
+        :return:
+        """
+        query = select(self.table).where(self.table.chat_id == chat_id).where(self.table.create_at >= since)
+        if exclude_id:
+            query = query.where(self.table.id != exclude_id)
+        return (await self._conn.execute(query.order_by(self.table.create_at).limit(limit))).scalars().all()
 
     # async def get_all(self, **kwargs) -> list[tables.Message]:
     #     return (
@@ -1,8 +1,10 @@
 import uuid
+from datetime import datetime
 from typing import Optional
 
-from sqlalchemy import insert, update, delete, func, select, or_, and_
-from sqlalchemy.orm import joinedload, selectinload
+
+from sqlalchemy import insert, update, delete, func, select, or_, and_, tuple_
+from sqlalchemy.orm import joinedload, selectinload, aliased
 
 from src.models import tables
 from src.services.repository.base import BaseRepository
@@ -11,29 +13,109 @@ from src.services.repository.base import BaseRepository
 class UserChatAssociationRepo(BaseRepository[tables.UserChatAssociation]):
     table = tables.UserChatAssociation
 
-    async def get_chat_id(self, user_id_one, user_id_two) -> Optional[uuid.UUID]:
-        uca = self.table.__table__
-        u = tables.User.__table__
-        c = tables.Chat.__table__
+    async def get_dialogs(
+            self,
+            user_id: uuid.UUID,
+            limit: int,
+            before: tuple[datetime, uuid.UUID] = None
+    ) -> list[tuple[tables.User, tables.Chat, datetime]]:
+        """
+        Диалоги пользователя от недавних к старым, одним запросом
+        по индексу (user_id, last_activity_at, chat_id)
+
+        :param user_id:
+        :param limit:
+        :param before: (last_activity_at, chat_id) - только диалоги старше этой позиции
+        :return: тройки (собеседник, диалог со сводкой, last_activity_at)
+        """
+        companion = aliased(self.table)
+        request = select(tables.User, tables.Chat, self.table.last_activity_at) \
+            .join(tables.Chat, tables.Chat.id == self.table.chat_id) \
+            .join(companion, and_(companion.chat_id == self.table.chat_id, companion.user_id != user_id)) \
+            .join(tables.User, tables.User.id == companion.user_id) \
+            .where(self.table.user_id == user_id) \
+            .order_by(self.table.last_activity_at.desc(), self.table.chat_id.desc()) \
+            .limit(limit)
+        if before:
+            request = request.where(tuple_(self.table.last_activity_at, self.table.chat_id) < before)
+
+        result = await self.session.execute(request)
+        return result.tuples().all()
 
-        request = select(uca.c.chat_id) \
-            .select_from(uca.join(u).join(c)) \
-            .where(or_(uca.c.user_id == user_id_one, uca.c.user_id == user_id_two)) \
-            .group_by(uca.c.chat_id) \
-            .having(func.count(uca.c.user_id) == 2)
+    async def get_user_chat_ids(self, user_id: uuid.UUID, chat_ids: list[uuid.UUID]) -> list[uuid.UUID]:
+        """
+        Возвращает те из chat_ids, в которых состоит пользователь
+
+        :param user_id:
+        :param chat_ids:
+        :return:
+        """
+        request = select(self.table.chat_id) \
+            .where(self.table.user_id == user_id) \
+            .where(self.table.chat_id.in_(chat_ids))
 
         result = await self._conn.execute(request)
-        return result.scalar()
+        return result.scalars().all()
 
-    async def get_chats(self, user_id: uuid.UUID) -> list[tuple[tables.User, tables.UserChatAssociation, tables.Chat]]:
-        request = select(tables.User, self.table, tables.Chat). \
-            join(self.table, and_(tables.User.id == self.table.user_id)). \
-            join(tables.Chat, and_(self.table.chat_id == tables.Chat.id)). \
-            options(joinedload(tables.User.chats), selectinload(tables.Chat.users)). \
-            where(and_(self.table.chat_id.in_(
-            select(self.table.chat_id).filter_by(user_id=user_id)),
-            tables.User.id != user_id))
+    async def get_members(
+            self,
+            chat_ids: list[uuid.UUID]
+    ) -> list[tuple[uuid.UUID, uuid.UUID, Optional[datetime]]]:
+        """
+        Возвращает участников сразу нескольких диалогов вместе с их отметками прочтения
 
-        result = await self.session.execute(request)
-        return result.unique().fetchall()
+        :param chat_ids:
+        :return: тройки (chat_id, user_id, last_read_at)
+        """
+        request = (
+            select(self.table.chat_id, self.table.user_id, self.table.last_read_at)
+            .where(self.table.chat_id.in_(chat_ids))
+        )
 
+        result = await self._conn.execute(request)
+        return result.tuples().all()
+
+    async def mark_read(
+            self,
+            user_id: uuid.UUID,
+            *,
+            chat_id: uuid.UUID = None,
+            message_id: uuid.UUID = None,
+            until: datetime = None
+    ) -> Optional[uuid.UUID]:
+        """
+        Сдвигает отметку прочтения диалога одним запросом (UPDATE ... RETURNING)
+
+        Отметка только растёт: прочтение более старого сообщения её не откатывает.
+
+        :param user_id:
+        :param chat_id: диалог; без message_id - прочитано всё на текущий момент
+        :param message_id: прочитано всё до этого сообщения включительно
+        :param until: прочитано всё до этого времени включительно (сообщение, ещё не записанное в БД)
+        :return: id диалога или None, если сообщение не найдено
+                 или пользователь не состоит в диалоге
+        """
+        request = update(self.table).where(self.table.user_id == user_id)
+        if message_id:
+            message = tables.Message.__table__
+            request = request \
+                .where(message.c.id == message_id) \
+                .where(self.table.chat_id == message.c.chat_id) \
+                .values(last_read_at=func.greatest(
+                    func.coalesce(self.table.last_read_at, message.c.create_at),
+                    message.c.create_at
+                ))
+        elif until:
+            request = request.values(last_read_at=func.greatest(
+                func.coalesce(self.table.last_read_at, until),
+                until
+            ))
+        else:
+            request = request.values(last_read_at=func.now())
+        if chat_id:
+            request = request.where(self.table.chat_id == chat_id)
+
+        result = await self._conn.execute(
+            request.returning(self.table.chat_id).execution_options(synchronize_session=False)
+        )
+        return result.scalar()
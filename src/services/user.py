@@ -130,9 +130,22 @@ class UserApplicationService:
         await self._update_user_password(user_id, password)
 
     @filters(roles=[UserRole.ADMIN, UserRole.HIGH_USER, UserRole.USER])
-    async def get_users(self) -> list[schemas.UserSmall]:
-        users = await self._repo.get_all()
-        return [schemas.UserSmall.from_orm(user) for user in users]
+    async def get_users(
+            self,
+            after: Optional[str] = None,
+            limit: Optional[int] = None
+    ) -> tuple[list[schemas.UserSmall], Optional[str]]:
+        """
+        Страница пользователей по email
+
+        next_cursor передаётся как after для следующей страницы и равен None,
+        когда пользователей больше нет.
+        """
+        try:
+            users, next_cursor = await self._repo.get_page(limit, order_by="email", after=after)
+        except ValueError as error:
+            raise BadRequest(str(error))
+        return [schemas.UserSmall.from_orm(user) for user in users], next_cursor
 
     @filters(roles=[UserRole.ADMIN])
     async def update_avatar(self, file: uuid.UUID):
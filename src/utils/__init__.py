@@ -1,3 +1,5 @@
 from .redis import RedisClient
 from .aiohttp_client import AiohttpClient
 from . import formators
+from . import cursor
+from . import conditional
@@ -0,0 +1,39 @@
+from typing import Optional
+
+from fastapi.requests import Request
+from fastapi.responses import Response
+
+
+def is_not_modified(request: Request, etag: Optional[str]) -> bool:
+    """
+    Совпадает ли ETag с одним из переданных клиентом в If-None-Match
+
+    :param request:
+    :param etag:
+    :return:
+    """
+    if not etag:
+        return False
+    if_none_match = request.headers.get("if-none-match")
+    if not if_none_match:
+        return False
+    return if_none_match.strip() == "*" or etag in (tag.strip() for tag in if_none_match.split(","))
+
+
+def set_etag(response: Response, etag: Optional[str]) -> None:
+    """
+    Проставляет ETag и требует от клиента перепроверять ответ при каждом запросе
+
+    :param response:
+    :param etag:
+    :return:
+    """
+    if etag:
+        response.headers["ETag"] = etag
+        response.headers["Cache-Control"] = "private, no-cache"
+
+
+def not_modified(etag: str) -> Response:
+    response = Response(status_code=304)
+    set_etag(response, etag)
+    return response
@@ -0,0 +1,93 @@
+import base64
+import json
+import uuid
+from datetime import datetime
+from typing import Sequence
+
+
+def encode_cursor(create_at: datetime, id: uuid.UUID) -> str:
+    """
+    Курсор для keyset-пагинации по (create_at, id)
+
+    :param create_at:
+    :param id:
+    :return: непрозрачная для клиента строка
+    """
+    raw = f"{create_at.isoformat()}|{id}"
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str) -> tuple[datetime, uuid.UUID]:
+    """
+    Разбирает курсор, полученный от encode_cursor
+
+    :param cursor:
+    :return: (create_at, id)
+    :raises ValueError: если курсор повреждён
+    """
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)).decode()
+        create_at, _, id = raw.partition("|")
+        return datetime.fromisoformat(create_at), uuid.UUID(id)
+    except (ValueError, UnicodeDecodeError) as ex:
+        raise ValueError(f"Некорректный курсор {cursor!r}") from ex
+
+
+def encode_rank_cursor(rank: float, create_at: datetime, id: uuid.UUID) -> str:
+    """
+    Курсор для keyset-пагинации ранжированной выдачи по (rank, create_at, id)
+
+    :param rank:
+    :param create_at:
+    :param id:
+    :return: непрозрачная для клиента строка
+    """
+    raw = f"{rank!r}|{create_at.isoformat()}|{id}"
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip("=")
+
+
+def decode_rank_cursor(cursor: str) -> tuple[float, datetime, uuid.UUID]:
+    """
+    Разбирает курсор, полученный от encode_rank_cursor
+
+    :param cursor:
+    :return: (rank, create_at, id)
+    :raises ValueError: если курсор повреждён
+    """
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)).decode()
+        rank, create_at, id = raw.split("|")
+        return float(rank), datetime.fromisoformat(create_at), uuid.UUID(id)
+    except (ValueError, UnicodeDecodeError) as ex:
+        raise ValueError(f"Некорректный курсор {cursor!r}") from ex
+
+
+def encode_key_cursor(values: Sequence) -> str:
+    """
+    Курсор для keyset-пагинации по произвольному набору колонок
+
+    :param values: значения ключа последней записи страницы (datetime, uuid, str, int)
+    :return: непрозрачная для клиента строка
+    """
+    raw = json.dumps([
+        value.isoformat() if isinstance(value, datetime) else str(value) if isinstance(value, uuid.UUID) else value
+        for value in values
+    ])
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip("=")
+
+
+def decode_key_cursor(cursor: str) -> list:
+    """
+    Разбирает курсор, полученный от encode_key_cursor
+
+    :param cursor:
+    :return: значения ключа в json-представлении (типы колонок восстанавливает вызывающий)
+    :raises ValueError: если курсор повреждён
+    """
+    try:
+        values = json.loads(base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)).decode())
+    except (ValueError, UnicodeDecodeError) as ex:
+        raise ValueError(f"Некорректный курсор {cursor!r}") from ex
+    if not isinstance(values, list):
+        raise ValueError(f"Некорректный курсор {cursor!r}")
+    return values
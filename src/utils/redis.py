@@ -178,3 +178,282 @@ class RedisClient:
                 exc_info=(type(ex), ex, ex.__traceback__),
             )
             raise ex
+
+    async def publish(self, channel: str, message: str):
+        """Выполнить команду Redis PUBLISH.
+         Публикует сообщение в канал. Сообщение получат все клиенты,
+         подписанные на этот канал.
+        Args:
+            channel (str): Канал.
+            message (str): Сообщение.
+        Returns:
+            response: Кол-во клиентов, получивших сообщение.
+        Raises:
+            aioredis.RedisError: Если клиент Redis дал сбой при выполнении команды.
+        """
+
+        self.log.debug(f"Сформирована Redis PUBLISH команда, channel: {channel}")
+        try:
+            return await self.redis_client.publish(channel, message)
+        except RedisError as ex:
+            self.log.exception(
+                "Команда Redis PUBLISH завершена с исключением",
+                exc_info=(type(ex), ex, ex.__traceback__),
+            )
+            raise ex
+
+    def pubsub(self) -> redis.client.PubSub:
+        """Создать объект Redis pub/sub.
+         Объект использует отдельное соединение из пула и
+         позволяет подписываться на каналы.
+        Returns:
+            response: Экземпляр redis.asyncio.client.PubSub.
+        """
+
+        return self.redis_client.pubsub(ignore_subscribe_messages=True)
+
+    async def xadd(self, key: str, fields: dict, maxlen: int, expire: int = None) -> str:
+        """Выполнить команду Redis XADD.
+         Добавляет запись в конец потока. Поток обрезается примерно
+         до maxlen последних записей (MAXLEN ~).
+        Args:
+            key (str): Ключ потока.
+            fields (dict): Поля записи.
+            maxlen (int): Примерная максимальная длина потока.
+            expire (int): Время в секундах, по истечении которого поток будет удален
+            (продлевается каждой записью).
+        Returns:
+            response: Идентификатор добавленной записи.
+        Raises:
+            aioredis.RedisError: Если клиент Redis дал сбой при выполнении команды.
+        """
+
+        self.log.debug(f"Сформирована Redis XADD команда, key: {key}")
+        try:
+            async with self.redis_client.pipeline(transaction=False) as pipe:
+                pipe.xadd(key, fields, maxlen=maxlen, approximate=True)
+                if expire:
+                    pipe.expire(key, expire)
+                return (await pipe.execute())[0]
+        except RedisError as ex:
+            self.log.exception(
+                "Команда Redis XADD завершена с исключением",
+                exc_info=(type(ex), ex, ex.__traceback__),
+            )
+            raise ex
+
+    async def xrange(self, key: str, min: str = "-", max: str = "+", count: int = None) -> list:
+        """Выполнить команду Redis XRANGE.
+         Возвращает записи потока с идентификаторами в диапазоне [min, max]
+         в порядке возрастания. Префикс "(" делает границу исключающей.
+        Args:
+            key (str): Ключ потока.
+            min (str): Начальный идентификатор.
+            max (str): Конечный идентификатор.
+            count (int): Максимальное кол-во записей.
+        Returns:
+            response: Список пар (идентификатор, поля).
+        Raises:
+            aioredis.RedisError: Если клиент Redis дал сбой при выполнении команды.
+        """
+
+        self.log.debug(f"Сформирована Redis XRANGE команда, key: {key}, min: {min}, max: {max}")
+        try:
+            return await self.redis_client.xrange(key, min=min, max=max, count=count)
+        except RedisError as ex:
+            self.log.exception(
+                "Команда Redis XRANGE завершена с исключением",
+                exc_info=(type(ex), ex, ex.__traceback__),
+            )
+            raise ex
+
+    async def xrevrange(self, key: str, max: str = "+", min: str = "-", count: int = None) -> list:
+        """Выполнить команду Redis XREVRANGE.
+         То же, что XRANGE, но записи возвращаются от новых к старым.
+        Args:
+            key (str): Ключ потока.
+            max (str): Конечный идентификатор.
+            min (str): Начальный идентификатор.
+            count (int): Максимальное кол-во записей.
+        Returns:
+            response: Список пар (идентификатор, поля).
+        Raises:
+            aioredis.RedisError: Если клиент Redis дал сбой при выполнении команды.
+        """
+
+        self.log.debug(f"Сформирована Redis XREVRANGE команда, key: {key}, max: {max}, min: {min}")
+        try:
+            return await self.redis_client.xrevrange(key, max=max, min=min, count=count)
+        except RedisError as ex:
+            self.log.exception(
+                "Команда Redis XREVRANGE завершена с исключением",
+                exc_info=(type(ex), ex, ex.__traceback__),
+            )
+            raise ex
+
+    async def mset(self, mapping: dict, expire: int = 2592000):
+        """Выполнить команды Redis SET для нескольких ключей за один проход.
+         Устанавливает значения ключей и время их жизни одним конвейером (pipeline).
+        Args:
+            mapping (dict): Ключи и значения.
+            expire (int): Время в секундах, по истечении которого ключи будут удалены.
+            (по умолчанию 30 дней)
+        Raises:
+            aioredis.RedisError: Если клиент Redis дал сбой при выполнении команды.
+        """
+
+        self.log.debug(f"Сформирована Redis SET команда, keys: {list(mapping)}")
+        try:
+            async with self.redis_client.pipeline(transaction=False) as pipe:
+                for key, value in mapping.items():
+                    pipe.set(key, value, ex=expire)
+                await pipe.execute()
+        except RedisError as ex:
+            self.log.exception(
+                "Команда Redis SET завершена с исключением",
+                exc_info=(type(ex), ex, ex.__traceback__),
+            )
+            raise ex
+
+    async def setnx(self, key: str, value: str, expire: int = 2592000) -> bool:
+        """Выполнить команду Redis SET NX.
+         Устанавливает значение, только если ключ ещё не существует.
+        Args:
+            key (str): Ключ.
+            value (str): Значение, которое необходимо установить.
+            expire (int): Время в секундах, по истечении которого ключ будет удален.
+            (по умолчанию 30 дней)
+        Returns:
+            response: True, если значение установлено.
+        Raises:
+            aioredis.RedisError: Если клиент Redis дал сбой при выполнении команды.
+        """
+
+        self.log.debug(f"Сформирована Redis SET NX команда, key: {key}")
+        try:
+            return bool(await self.redis_client.set(key, value, ex=expire, nx=True))
+        except RedisError as ex:
+            self.log.exception(
+                "Команда Redis SET NX завершена с исключением",
+                exc_info=(type(ex), ex, ex.__traceback__),
+            )
+            raise ex
+
+    async def hgetall(self, key: str) -> dict:
+        """Выполнить команду Redis HGETALL.
+         Возвращает все поля и значения хэша.
+        Args:
+            key (str): Ключ.
+        Returns:
+            response: Словарь полей хэша (пустой, если ключ не существует).
+        Raises:
+            aioredis.RedisError: Если клиент Redis дал сбой при выполнении команды.
+        """
+
+        self.log.debug(f"Сформирована Redis HGETALL команда, key: {key}")
+        try:
+            return await self.redis_client.hgetall(key)
+        except RedisError as ex:
+            self.log.exception(
+                "Команда Redis HGETALL завершена с исключением",
+                exc_info=(type(ex), ex, ex.__traceback__),
+            )
+            raise ex
+
+    async def hreplace(self, key: str, mapping: dict, expire: int = 2592000):
+        """Заменить хэш целиком.
+         Удаляет ключ и записывает новые поля одной транзакцией (MULTI/EXEC).
+        Args:
+            key (str): Ключ.
+            mapping (dict): Поля и значения хэша.
+            expire (int): Время в секундах, по истечении которого ключ будет удален.
+            (по умолчанию 30 дней)
+        Raises:
+            aioredis.RedisError: Если клиент Redis дал сбой при выполнении команды.
+        """
+
+        self.log.debug(f"Сформирована Redis DEL/HSET команда, key: {key}")
+        try:
+            async with self.redis_client.pipeline(transaction=True) as pipe:
+                pipe.delete(key)
+                pipe.hset(key, mapping=mapping)
+                pipe.expire(key, expire)
+                await pipe.execute()
+        except RedisError as ex:
+            self.log.exception(
+                "Команда Redis DEL/HSET завершена с исключением",
+                exc_info=(type(ex), ex, ex.__traceback__),
+            )
+            raise ex
+
+    async def eval(self, script: str, keys: list, args: list):
+        """Выполнить команду Redis EVAL.
+         Атомарно выполняет Lua-скрипт на сервере.
+        Args:
+            script (str): Текст скрипта.
+            keys (list): Ключи (KEYS).
+            args (list): Аргументы (ARGV).
+        Returns:
+            response: Результат скрипта.
+        Raises:
+            aioredis.RedisError: Если клиент Redis дал сбой при выполнении команды.
+        """
+
+        self.log.debug(f"Сформирована Redis EVAL команда, keys: {keys}")
+        try:
+            return await self.redis_client.eval(script, len(keys), *keys, *args)
+        except RedisError as ex:
+            self.log.exception(
+                "Команда Redis EVAL завершена с исключением",
+                exc_info=(type(ex), ex, ex.__traceback__),
+            )
+            raise ex
+
+    async def smembers(self, keys: list[str]) -> list[set]:
+        """Выполнить команду Redis SMEMBERS для нескольких ключей.
+         Читает множества одним конвейером (pipeline).
+        Args:
+            keys (list): Ключи.
+        Returns:
+            response: Множества в порядке ключей, пустые - для отсутствующих ключей.
+        Raises:
+            aioredis.RedisError: Если клиент Redis дал сбой при выполнении команды.
+        """
+
+        self.log.debug(f"Сформирована Redis SMEMBERS команда, keys: {keys}")
+        try:
+            async with self.redis_client.pipeline(transaction=False) as pipe:
+                for key in keys:
+                    pipe.smembers(key)
+                return await pipe.execute()
+        except RedisError as ex:
+            self.log.exception(
+                "Команда Redis SMEMBERS завершена с исключением",
+                exc_info=(type(ex), ex, ex.__traceback__),
+            )
+            raise ex
+
+    async def sadd(self, mapping: dict[str, list], expire: int = 2592000):
+        """Выполнить команду Redis SADD для нескольких ключей.
+         Добавляет значения в множества одним конвейером (pipeline).
+        Args:
+            mapping (dict): Ключи и добавляемые значения.
+            expire (int): Время в секундах, по истечении которого ключ будет удален.
+            (по умолчанию 30 дней)
+        Raises:
+            aioredis.RedisError: Если клиент Redis дал сбой при выполнении команды.
+        """
+
+        self.log.debug(f"Сформирована Redis SADD команда, keys: {list(mapping)}")
+        try:
+            async with self.redis_client.pipeline(transaction=False) as pipe:
+                for key, values in mapping.items():
+                    pipe.sadd(key, *values)
+                    pipe.expire(key, expire)
+                await pipe.execute()
+        except RedisError as ex:
+            self.log.exception(
+                "Команда Redis SADD завершена с исключением",
+                exc_info=(type(ex), ex, ex.__traceback__),
+            )
+            raise ex
@@ -3,7 +3,8 @@ from .user import UserBigResponse
 from .user import UserSmallResponse
 
 from .dialog import DialogListResponse, DialogResponse, DialogItem
-from .message import MessageOutput
+from .message import MessageOutput, CompactMessageOutput, Participant, MessageSearchHit
+from .event import ChatEvent
 
 from .article import DeleteArticleResponse
 from .article import CreateArticleResponse
@@ -1,4 +1,5 @@
 import uuid
+from typing import Optional
 
 from src.models.schemas.article import Article, ArticleDelete, CreateArticle
 from src.views import BaseView
@@ -6,6 +7,7 @@ from src.views import BaseView
 
 class ArticleListResponse(BaseView):
     message: list[Article]
+    next_cursor: Optional[str] = None
 
 
 class ArticleResponse(BaseView):
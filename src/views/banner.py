@@ -1,9 +1,12 @@
+from typing import Optional
+
 from src.models.schemas.banner import Banner
 from src.views.base import BaseView
 
 
 class BannerResponse(BaseView):
     message: list[Banner]
+    next_cursor: Optional[str] = None
 
 
 class BannerAddResponse(BaseView):
@@ -1,4 +1,5 @@
 import uuid
+from datetime import datetime
 from typing import Optional
 
 from pydantic import BaseModel
@@ -16,6 +17,9 @@ class DialogItem(BaseModel):
     companion_id: str
     unread_count: int
     role: UserRole
+    last_message_id: Optional[str] = None
+    last_message_at: Optional[datetime] = None
+    last_message_preview: Optional[str] = None
 
 
 class DialogResponse(BaseView):
@@ -24,3 +28,4 @@ class DialogResponse(BaseView):
 
 class DialogListResponse(BaseView):
     message: list[DialogItem]
+    next_cursor: Optional[str] = None
@@ -0,0 +1,13 @@
+from typing import Any, Optional
+
+from pydantic import BaseModel
+
+from src.models.enums import ChatEventType
+
+
+class ChatEvent(BaseModel):
+    event: ChatEventType
+    chat_id: Optional[str]
+    data: Optional[Any]
+    offset: Optional[str]
+    participants: Optional[dict]
@@ -23,9 +23,57 @@ class MessageOutput(BaseModel):
     update_at: Optional[datetime]
 
 
+class Participant(BaseModel):
+    id: str
+    avatar_id: Optional[str]
+    first_name: str
+    last_name: str
+    patronymic: Optional[str]
+
+
+class CompactMessageOutput(BaseModel):
+    """
+    Сообщение без профиля автора: профиль передаётся один раз в participants
+
+    """
+    id: str
+    text: Optional[str]
+    owner_id: str
+    is_read: bool
+    files: list[MessageFileInclusion]
+
+    create_at: datetime
+    update_at: Optional[datetime]
+
+
 class MessageResponse(BaseView):
     message: list[MessageOutput]
 
 
+class MessagePageResponse(BaseView):
+    message: list[MessageOutput]
+    next_cursor: Optional[str]
+
+
+class CompactMessagePageResponse(BaseView):
+    message: list[CompactMessageOutput]
+    participants: dict[str, Participant]
+    next_cursor: Optional[str]
+
+
+class MessageSearchHit(BaseModel):
+    id: str
+    chat_id: str
+    owner_id: str
+    snippet: Optional[str]
+    rank: float
+    create_at: datetime
+
+
+class MessageSearchResponse(BaseView):
+    message: list[MessageSearchHit]
+    next_cursor: Optional[str]
+
+
 class MessageCountResponse(BaseView):
     message: int
@@ -1,3 +1,5 @@
+from typing import Optional
+
 from src.views.base import BaseView
 from src.models.schemas import User, UserSmall, UserMiddle
 
@@ -16,3 +18,4 @@ class UserSmallResponse(BaseView):
 
 class UserListResponse(BaseView):
     message: list[UserSmall]
+    next_cursor: Optional[str] = None